@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+
+import sys
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from collections import deque
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# Quick'n'Dirty! Change!
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from basta import FileUtils as futils
+from basta import TaxTree as ttree
+from basta import StageProfile
+
+
+############
+#
+#   Staged pipeline for sequence assignment: parsing, database lookup,
+#   LCA and output run concurrently, connected by bounded queues
+#
+####
+#   COPYRIGHT DISCLAIMER:
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   Author: BASTA contributors
+#   Date:   October 2026
+#
+
+
+# Number of query sequences passed between stages at once
+BATCH_SIZE = 1000
+
+# Maximum number of batches waiting in front of each stage
+QUEUE_SIZE = 8
+
+_END = None
+
+
+class Counter():
+    """Throughput counter of one pipeline stage"""
+
+    def __init__(self,name):
+        self.name = name
+        self.queries = 0
+        self.batches = 0
+        self.busy = 0.0
+        self.cpu = 0.0
+
+    def add(self,queries,elapsed,cpu=0.0):
+        self.queries += queries
+        self.batches += 1
+        self.busy += elapsed
+        self.cpu += cpu
+
+    def rate(self):
+        return self.queries/self.busy if self.busy else 0.0
+
+    def as_dict(self):
+        return {'queries':self.queries,'batches':self.batches,'busy_sec':self.busy,'cpu_sec':self.cpu,'queries_per_sec':self.rate()}
+
+
+
+class Pipeline():
+
+    def __init__(self,assigner,processes):
+        self.assigner = assigner
+        self.processes = processes
+        self.logger = logging.getLogger()
+        self.stop = threading.Event()
+        self.errors = []
+        self.counters = [Counter(x) for x in ['parse','lookup','lca','output']]
+
+
+    def run(self,blast,tax_lookup,map_lookup,out_fh,best,missing):
+        # The LCA processes are forked before any thread is started, so
+        # that they do not inherit locks held by the stage threads
+        pool = multiprocessing.Pool(self.processes)
+        parsed = queue.Queue(QUEUE_SIZE)
+        resolved = queue.Queue(QUEUE_SIZE)
+        assigned = queue.Queue(QUEUE_SIZE)
+        threads = [threading.Thread(target=self._guard,args=(self._parse,parsed,blast)),
+                   threading.Thread(target=self._guard,args=(self._lookup,resolved,parsed,tax_lookup,map_lookup,missing)),
+                   threading.Thread(target=self._guard,args=(self._output,None,assigned,out_fh,best))]
+        try:
+            for t in threads:
+                t.daemon = True
+                t.start()
+            self._guard(self._lca,assigned,resolved,pool)
+        finally:
+            pool.terminate()
+            for t in threads:
+                if t.is_alive():
+                    t.join()
+
+        for c in self.counters:
+            self.logger.info("\n# [BASTA STATUS] Stage %s: %d queries in %.2fsec busy (%.0f queries/sec)" % (c.name,c.queries,c.busy,c.rate()))
+        if self.errors:
+            raise self.errors[0]
+        return dict((c.name,c.as_dict()) for c in self.counters)
+
+
+    # Run one stage. On error every stage is stopped and
+    # the end marker is passed on to the next stage.
+    def _guard(self,stage,out_q,*args):
+        try:
+            stage(out_q,*args)
+        except Exception as e:
+            self.errors.append(e)
+            self.stop.set()
+        if out_q is not None:
+            self._put(out_q,_END)
+
+
+    def _put(self,q,item):
+        while not self.stop.is_set() or item is _END:
+            try:
+                q.put(item,timeout=0.1)
+                return
+            except queue.Full:
+                if item is _END and self.stop.is_set():
+                    return
+
+
+    def _get(self,q):
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _END
+
+
+    def _parse(self,out_q,blast):
+        a = self.assigner
+        counter = self.counters[0]
+        stats = a.profile.counters if a.profile else None
+        batch = []
+        start = time.time()
+        cpu = StageProfile.cpu_time()
+        for seq_hits in futils.hit_gen(blast,a.alen,a.evalue,a.identity,a.config,a.num,stats,names=a.name_memo):
+            for seq in seq_hits:
+                batch.append((seq,seq_hits[seq]))
+            if len(batch) >= BATCH_SIZE:
+                counter.add(len(batch),time.time()-start,StageProfile.cpu_time()-cpu)
+                self._put(out_q,batch)
+                if self.stop.is_set():
+                    return
+                batch = []
+                start = time.time()
+                cpu = StageProfile.cpu_time()
+        if batch:
+            counter.add(len(batch),time.time()-start,StageProfile.cpu_time()-cpu)
+            self._put(out_q,batch)
+
+
+    def _lookup(self,out_q,in_q,tax_lookup,map_lookup,missing):
+        counter = self.counters[1]
+        while True:
+            batch = self._get(in_q)
+            if batch is _END:
+                return
+            start = time.time()
+            cpu = StageProfile.cpu_time()
+            resolved = []
+            early = self.assigner._early_stop()
+            for (seq,hits) in batch:
+                taxa = []
+                self.assigner._get_tax_list(hits,map_lookup,tax_lookup,taxa,missing,early)
+                resolved.append((seq,taxa))
+            counter.add(len(batch),time.time()-start,StageProfile.cpu_time()-cpu)
+            self._put(out_q,resolved)
+
+
+    # LCA batches are computed by the process pool. At most
+    # processes*2 batches are in flight and results are passed
+    # on in input order.
+    def _lca(self,out_q,in_q,pool):
+        counter = self.counters[2]
+        a = self.assigner
+        memo_size = a.lca_memo.size if a.lca_memo and not a.info_file else 0
+        pending = deque()
+        done = False
+        while pending or not done:
+            if not done and len(pending) < self.processes*2:
+                batch = self._get(in_q)
+                if batch is _END:
+                    done = True
+                    continue
+                pending.append((batch,pool.apply_async(_lca_batch,([x[1] for x in batch],a.minimum,a.lazy,a.method,bool(a.info_file),memo_size))))
+                continue
+            (batch,result) = pending.popleft()
+            (lcas,trees,elapsed,cpu,memo_hits) = result.get()
+            counter.add(len(batch),elapsed,cpu)
+            if memo_size:
+                a.lca_memo.hits += memo_hits
+                a.lca_memo.misses += len(batch) - memo_hits
+            self._put(out_q,[(batch[i][0],lcas[i],batch[i][1],trees[i]) for i in range(len(batch))])
+            if self.stop.is_set():
+                return
+
+
+    def _output(self,out_q,in_q,out_fh,best):
+        counter = self.counters[3]
+        a = self.assigner
+        print_ = a._query_writer(a.profile)
+        while True:
+            batch = self._get(in_q)
+            if batch is _END:
+                return
+            start = time.time()
+            cpu = StageProfile.cpu_time()
+            for (seq,lca,taxa,tree) in batch:
+                if a.info_file:
+                    a._print_info(taxa,seq,tree)
+                print_(out_fh,seq,lca,best,taxa)
+            counter.add(len(batch),time.time()-start,StageProfile.cpu_time()-cpu)
+
+
+
+# LCA memo of a worker process, kept between batches
+_memo = None
+
+
+# Runs in the worker processes. Returns the LCAs, the trees (only
+# if needed for the info file), the wall and CPU time spent and the
+# number of LCAs taken from the memo of the worker (only used if
+# memo_size is set and no trees are needed).
+def _lca_batch(taxa_lists,minimum,lazy,method,keep_trees,memo_size=0):
+    global _memo
+    start = time.time()
+    cpu = StageProfile.cpu_time()
+    lcas = []
+    trees = []
+    if memo_size and not keep_trees:
+        if _memo is None or _memo.size != memo_size:
+            _memo = ttree.LCAMemo(memo_size)
+        hits = _memo.hits
+        for t in taxa_lists:
+            lcas.append(_memo.get_lca(t,minimum,lazy,method))
+        return (lcas,[None]*len(lcas),time.time()-start,StageProfile.cpu_time()-cpu,_memo.hits-hits)
+    for t in taxa_lists:
+        tree = ttree.build_tree(t)
+        lcas.append(ttree.tree_lca(tree,len(t),minimum,lazy,method))
+        trees.append(tree if keep_trees else None)
+    return (lcas,trees,time.time()-start,StageProfile.cpu_time()-cpu,0)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+
+import sys
+import os
+import stat
+import json
+import errno
+import socket
+import signal
+import logging
+import threading
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+# Quick'n'Dirty! Change!
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from basta import AssignTaxonomy
+from basta import DBUtils as db
+from basta import StageProfile
+from basta import TaxTree as ttree
+
+
+############
+#
+#   Long-running assignment server keeping the databases open
+#   and a thin client to submit jobs through a unix socket
+#
+####
+#   COPYRIGHT DISCLAIMER:
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   Author: BASTA contributors
+#   Date:   October 2026
+#
+
+
+# Protocol: the client sends one line of JSON describing the job. If
+# the job has no hit file the hits follow on the same connection until
+# the client shuts down its write end. The server answers with one
+# line of JSON containing "status" and either "output" or "message".
+
+
+class Server():
+
+    def __init__(self,directory,socket_path,cache_size=None):
+        self.directory = directory
+        self.socket_path = socket_path
+        self.cache_size = cache_size
+        self.logger = logging.getLogger()
+        self.lock = threading.Lock()
+        self._check_socket()
+        self.logger.info("\n# [BASTA STATUS] Initializing taxonomy database")
+        self.tax_lookup = db._init_db(os.path.join(directory,"complete_taxa.db"),cache_size)
+        self.lookups = {}
+        # memos shared by all jobs: LCAs by memo size and accessions
+        # of subject IDs
+        self.lca_memos = {}
+        self.name_memo = {}
+
+
+    def serve(self):
+        server = _ThreadingUnixServer(self.socket_path,_JobHandler)
+        server.basta = self
+        signal.signal(signal.SIGTERM,lambda s,f: sys.exit(0))
+        self.logger.info("\n# [BASTA STATUS] Waiting for jobs on %s" % (self.socket_path))
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+    # A socket left by a server that is gone is removed. The server
+    # does not start if another one is listening on the socket or the
+    # path is not a socket.
+    def _check_socket(self):
+        if not os.path.exists(self.socket_path):
+            return
+        if not stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+            self.logger.error("\n# [BASTA ERROR] %s exists and is not a socket" % (self.socket_path))
+            sys.exit(1)
+        sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except socket.error as e:
+            if e.errno != errno.ECONNREFUSED:
+                raise
+            os.remove(self.socket_path)
+            return
+        finally:
+            sock.close()
+        self.logger.error("\n# [BASTA ERROR] Another BASTA server is listening on %s" % (self.socket_path))
+        sys.exit(1)
+
+
+    # Databases of a mapping are opened on first use the same way as
+    # by 'basta sequence' and kept open for all following jobs
+    def _get_lookups(self,db_file):
+        with self.lock:
+            if db_file not in self.lookups:
+                self.lookups[db_file] = db.open_lookups(self.directory,db_file,cache_size=self.cache_size,tax_lookup=self.tax_lookup)
+            return self.lookups[db_file]
+
+
+    def _run_job(self,job,hits):
+        assigner = AssignTaxonomy.Assigner(job['evalue'],job['alen'],job['identity'],job['number'],job['minimum'],job['lazy'],job['tax_method'],self.directory,job['config_path'],job['output'])
+        if job['verbose']:
+            assigner.info_file = job['verbose']
+            assigner.info_format = job.get('verbose_format',"text")
+        if job.get('missing'):
+            assigner.missing_file = job['missing']
+        if job.get('profile'):
+            assigner.profile_file = job['output'] + StageProfile.SUFFIX
+        if job.get('abundance'):
+            assigner.abundance_file = job['abundance']
+        assigner.write_reads = not job.get('no_output')
+        if job.get('lca_cache'):
+            assigner.lca_memo = ttree.LCAMemo(job['lca_cache'],self.lca_memos.setdefault(job['lca_cache'],{}))
+        assigner.name_memo = self.name_memo
+        db_file = db.get_db_name(self.directory,job['type'])
+        assigner.lookups = self._get_lookups(db_file)
+        assigner._assign_sequence(job['blast'] or hits,db_file,job['best_hit'])
+
+
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn,socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        basta = self.server.basta
+        line = self.rfile.readline()
+        # connection without job, e.g. of a server checking its socket
+        if not line:
+            return
+        try:
+            job = json.loads(line.decode())
+            basta.logger.info("\n# [BASTA STATUS] Job started: %s" % (job['output']))
+            hits = None
+            if not job['blast']:
+                hits = self.rfile
+            basta._run_job(job,hits)
+            reply = {'status':'ok','output':job['output']}
+            basta.logger.info("\n# [BASTA STATUS] Job done: %s" % (job['output']))
+        except (Exception,SystemExit) as e:
+            basta.logger.error("\n# [BASTA ERROR] Job failed: %s" % (str(e)))
+            reply = {'status':'error','message':str(e)}
+        self.wfile.write((json.dumps(reply) + "\n").encode())
+
+
+
+# Send one job to a running server. If hits is given it is a file
+# object whose content is streamed to the server.
+def submit(socket_path,job,hits=None):
+    sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    sock.connect(socket_path)
+    try:
+        sock.sendall((json.dumps(job) + "\n").encode())
+        if hits is not None:
+            while True:
+                chunk = hits.read(1024*1024)
+                if not chunk:
+                    break
+                sock.sendall(chunk if isinstance(chunk,bytes) else chunk.encode())
+        sock.shutdown(socket.SHUT_WR)
+        reply = sock.makefile("rb").readline()
+    finally:
+        sock.close()
+    if not reply:
+        return {'status':'error','message':'no reply from server'}
+    return json.loads(reply.decode())
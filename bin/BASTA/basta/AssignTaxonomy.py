@@ -2,13 +2,21 @@
 
 import sys
 import os
+import time
 import logging
+import multiprocessing
+from functools import partial
+from collections import OrderedDict
 
 # Quick'n'Dirty! Change!
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from basta import FileUtils as futils
 from basta import TaxTree as ttree
 from basta import DBUtils as db
+from basta import AssignPipeline
+from basta import StageProfile
+from basta import BloomFilter
+from basta import Checkpoint
 
 
 
@@ -53,6 +61,26 @@ class Assigner():
         self.output = output
         self.directory=directory
         self.info_file=""
+        self.info_format="text"
+        self.info_writer=None
+        self.missing=MissingIDs()
+        self.missing_file=""
+        self.lookups=None
+        self.processes=0
+        self.stage_counters={}
+        self.profile_file=""
+        self.profile=None
+        self.lca_memo=None
+        self.name_memo=None
+        self.abundance_file=""
+        self.abundance=None
+        self.write_reads=True
+        self.shared=False
+        self.bloom_lookup=None
+        self.skipped_hits=0
+        self.queries=0
+        self.checkpoint_interval=0
+        self.resume=False
         if config_path:
             self.config=self._read_config(config_path)
         else:
@@ -61,123 +89,428 @@ class Assigner():
 
     def _assign_sequence(self,blast,db_file,best):
         self.logger.info("\n# [BASTA STATUS] Assigning taxonomies ...")
-        (tax_lookup, map_lookup) = self._get_lookups(db_file)
-        nofo_map = []
-        out_fh = open(self.output,"w")
-        print(self.info_file)
-        for seq_hits in futils.hit_gen(blast,self.alen,self.evalue,self.identity,self.config,self.num):
-            for seq in seq_hits:
-                taxa = []
-                self._get_tax_list(seq_hits[seq],map_lookup,tax_lookup,taxa,nofo_map)
-                lca = self._getLCS(taxa)
-                if self.info_file:
-                    self._print_info(taxa,seq)
-                self._print(out_fh,seq,lca,best,taxa)
-        out_fh.close()
+        prof = self._init_profile("sequence")
+        self.abundance = Abundance() if self.abundance_file else None
+        (tax_lookup, map_lookup) = self._get_lookups(db_file,prof)
+        ckpt = self._init_checkpoint(blast,db_file,best)
+        out_fh = self._open_output(ckpt) if self.write_reads else None
+        if self.processes:
+            pipeline = AssignPipeline.Pipeline(self,self.processes)
+            self.stage_counters = pipeline.run(blast,tax_lookup,map_lookup,out_fh,best,self.missing)
+            if prof:
+                prof.add_pipeline(self.stage_counters)
+        else:
+            seqs = futils.hit_gen(blast,self.alen,self.evalue,self.identity,self.config,self.num,prof.counters if prof else None,ckpt.progress if ckpt else None,self.name_memo)
+            (seqs,get_lca,print_info,print_) = self._stage_funcs(prof,seqs)
+            for seq_hits in seqs:
+                for seq in seq_hits:
+                    taxa = []
+                    self._get_tax_list(seq_hits[seq],map_lookup,tax_lookup,taxa,self.missing,self._early_stop())
+                    (lca,tree) = get_lca(taxa)
+                    if self.info_file:
+                        print_info(taxa,seq,tree)
+                    print_(out_fh,seq,lca,best,taxa)
+                    self.queries += 1
+                if ckpt and ckpt.due():
+                    self._write_checkpoint(ckpt,out_fh)
+        if out_fh:
+            out_fh.close()
+        self._close_info()
+        self._write_abundance()
+        self._report_missing()
+        self._report_memo()
+        self._write_profile()
+        if ckpt:
+            ckpt.remove()
+
+
+    # Checkpoint of the run, None if checkpoints are off. On resume
+    # the counters of the interrupted run are restored from it.
+    def _init_checkpoint(self,blast,db_file,best):
+        if not self.checkpoint_interval and not self.resume:
+            return None
+        settings = {'blast':os.path.abspath(blast),'blast_size':os.path.getsize(blast),'db_file':db_file,'evalue':self.evalue,'alen':self.alen,'identity':self.identity,'number':self.num,'minimum':self.minimum,'lazy':self.lazy,'method':self.method,'best_hit':bool(best),'config':self.config,'output':self.write_reads,'verbose':self.info_file or None,'abundance':self.abundance_file or None}
+        ckpt = Checkpoint.Checkpoint(self.output + Checkpoint.SUFFIX,self.checkpoint_interval,settings)
+        if not self.resume:
+            return ckpt
+        try:
+            state = ckpt.read()
+            if state:
+                self._restore(state)
+        except Checkpoint.CheckpointError as e:
+            self.logger.error("\n# [BASTA ERROR] %s" % (e))
+            sys.exit()
+        if state:
+            self.logger.info("\n# [BASTA STATUS] Resuming after %d queries at byte %d of %s" % (self.queries,state['offset'],blast))
+        else:
+            self.logger.warning("\n# [BASTA WARNING] No checkpoint %s, starting from the beginning" % (ckpt.path))
+        return ckpt
+
+
+    def _restore(self,state):
+        for (name,offset) in [(self.output,state['output_offset']),(self.info_file,state['info_offset'])]:
+            if not name or offset is None:
+                continue
+            if not os.path.exists(name) or os.path.getsize(name) < offset:
+                raise Checkpoint.CheckpointError("%s is shorter than at the checkpoint" % (name))
+            # output written after the checkpoint is cut off
+            with open(name,"r+b") as f:
+                f.truncate(offset)
+        self.queries = state['queries']
+        self.missing.restore(state['missing'])
+        if self.abundance is not None:
+            self.abundance.lcas = dict((Checkpoint.decode(k),v) for (k,v) in state['abundance'].items())
+        self.skipped_hits = state['skipped_hits']
+        if self.lca_memo:
+            self.lca_memo.hits = state['lca_memo']['hits']
+            self.lca_memo.misses = state['lca_memo']['misses']
+        if self.bloom_lookup:
+            for k in ['lookups','rejected','false_positives']:
+                setattr(self.bloom_lookup,k,state['bloom'][k])
+
+
+    # Output and info file are flushed to disk before the checkpoint
+    # records their length
+    def _write_checkpoint(self,ckpt,out_fh):
+        offsets = []
+        for fh in [out_fh,self.info_writer.fh if self.info_writer else None]:
+            if fh:
+                fh.flush()
+                os.fsync(fh.fileno())
+                offsets.append(fh.tell())
+            else:
+                offsets.append(None)
+        if self.info_file and not self.info_writer:
+            offsets[1] = os.path.getsize(self.info_file) if os.path.exists(self.info_file) else 0
+        b = self.bloom_lookup
+        ckpt.write({
+            'output_offset':offsets[0],
+            'info_offset':offsets[1],
+            'queries':self.queries,
+            'missing':self.missing.as_dict(),
+            'abundance':dict((Checkpoint.encode(k),v) for (k,v) in self.abundance.lcas.items()) if self.abundance is not None else None,
+            'skipped_hits':self.skipped_hits,
+            'lca_memo':{'hits':self.lca_memo.hits,'misses':self.lca_memo.misses} if self.lca_memo else None,
+            'bloom':{'lookups':b.lookups,'rejected':b.rejected,'false_positives':b.false_positives} if b else None,
+        })
+
+
+    # A resumed run appends to the output of the interrupted one
+    def _open_output(self,ckpt):
+        if ckpt and ckpt.state:
+            return open(self.output,"ab",futils.BUFFER_SIZE)
+        return futils.open_binary(self.output,"wb")
 
 
     def _assign_single(self,blast,db_file,best):
         self.logger.info("\n# [BASTA STATUS] Assigning taxonomies ...")
-        (tax_lookup, map_lookup) = self._get_lookups(db_file)
-        taxa = []
-        nofo_map = []
-        out_fh = open(self.output, "w")
-        for seq_hits in futils.hit_gen(blast,self.alen,self.evalue,self.identity,self.config,self.num):
-            for seq in seq_hits:
-                self._get_tax_list(seq_hits[seq],map_lookup,tax_lookup,taxa,nofo_map)
-        lca = self._getLCS([x for x in taxa if x])
+        prof = self._init_profile("single")
+        (tax_lookup, map_lookup) = self._get_lookups(db_file,prof)
+        out_fh = futils.open_binary(self.output,"wb")
+        (lca,counts) = self._file_lca(self._parse_file(blast,prof),tax_lookup,map_lookup,prof)
+        (_,_,print_info,print_) = self._stage_funcs(prof,unit="files")
         if self.info_file:
-            self._print_info(taxa,"Sequence")
-        self._print(out_fh,"Sequence",lca,best,taxa)
+            print_info(None,b"Sequence",counts.tree())
+        print_(out_fh,b"Sequence",lca,best,counts.best())
+        out_fh.close()
+        self._close_info()
+        self._report_missing()
+        self._write_profile()
         return lca
 
 
-    def _assign_multiple(self,blast_dir,db_file,best):
+    # Files are parsed by a pool of processes, forked before the
+    # databases are opened (LevelDB does not allow several processes
+    # to open the same database). Each returns the hit IDs of its file,
+    # which are looked up by the main process. Results are written in
+    # the order of the files as soon as a file is done.
+    def _assign_multiple(self,blast_dir,db_file,best,workers=1):
         self.logger.info("\n# [BASTA STATUS] Assigning taxonomies ...")
+        prof = self._init_profile("multiple")
+        files = sorted([bf for bf in os.listdir(blast_dir) if os.path.isfile(os.path.join(blast_dir,bf))])
+        pool = multiprocessing.Pool(max(1,workers))
+        try:
+            (tax_lookup, map_lookup) = self._get_lookups(db_file,prof)
+            out_fh = futils.open_binary(self.output,"wb")
+            out_fh.write(b"#File\tLCA\n")
+            (_,_,print_info,print_) = self._stage_funcs(prof,unit="files")
+            parse = partial(_file_hits,alen=self.alen,evalue=self.evalue,identity=self.identity,config=self.config,num=self.num,profile=bool(prof))
+            for (bf,hits) in zip(files,pool.imap(parse,[os.path.join(blast_dir,bf) for bf in files])):
+                self.logger.info("\n# [BASTA STATUS] - Estimating Last Common Ancestor for file  %s" % (str(bf)))
+                (lca,counts) = self._file_lca(self._parsed_hits(hits,prof),tax_lookup,map_lookup,prof)
+                if self.info_file:
+                    print_info(None,futils.to_bytes(bf),counts.tree())
+                print_(out_fh,futils.to_bytes(bf),lca,best,counts.best())
+                out_fh.flush()
+        finally:
+            pool.terminate()
+        out_fh.close()
+        self._close_info()
+        self._report_missing()
+        self._write_profile()
+
+
+    # All settings of a sweep share one pass over the hit file. Hits
+    # are parsed with the loosest thresholds of all settings, each hit
+    # is looked up at most once and every setting regroups the hits it
+    # accepts like a run of 'basta sequence' with its parameters would.
+    def _assign_sweep(self,blast,db_file,best,settings):
+        self.logger.info("\n# [BASTA STATUS] Assigning taxonomies for %d settings ..." % (len(settings)))
         (tax_lookup, map_lookup) = self._get_lookups(db_file)
-        out_fh = open(self.output,"w")
-        out_fh.write("#File\tLCA\n")
-        nofo_map = []
-        for bf in os.listdir(blast_dir):
-            self.logger.info("\n# [BASTA STATUS] - Estimating Last Common Ancestor for file  %s" % (str(bf)))
-            lca = self._assign_single(os.path.join(blast_dir,bf),db_file)
-            out_fh.write("%s\t%s\n" %(bf,lca))
-        out_fh.close() 
+        get_lca = self.lca_memo.get_lca if self.lca_memo else ttree.get_lca
+        fhs = [futils.open_binary(s.output,"wb") for s in settings]
+
+        def resolve(entry):
+            if entry[1] is _UNRESOLVED:
+                taxa = []
+                self._get_tax_list([entry[0]],map_lookup,tax_lookup,taxa,self.missing)
+                entry[1] = taxa[0] if taxa else None
+            return entry[1]
+
+        def finish(s,fh,group):
+            (seq,entries) = group
+            taxa = [t for t in (resolve(e) for e in entries) if t is not None]
+            self._print(fh,seq,get_lca(taxa,s.minimum,self.lazy,s.method),best,taxa)
+
+        seqs = futils.hit_gen(blast,self.alen,self.evalue,self.identity,self.config,0)
+        for seq_hits in seqs:
+            for seq in seq_hits:
+                for hit in seq_hits[seq]:
+                    entry = [hit,_UNRESOLVED]
+                    for (s,fh) in zip(settings,fhs):
+                        group = s.add(seq,entry)
+                        if group:
+                            finish(s,fh,group)
+        for (s,fh) in zip(settings,fhs):
+            group = s.flush()
+            if group:
+                finish(s,fh,group)
+            fh.close()
+            self.logger.info("\n# [BASTA STATUS] %s written to %s" % (s.name(),s.output))
+        self._report_missing()
+        self._report_memo()
+
+
+    # Hit IDs of a file parsed by this process
+    def _parse_file(self,blast,prof=None):
+        return self._parsed_hits(_file_hits(blast,self.alen,self.evalue,self.identity,self.config,self.num,bool(prof)),prof)
+
+
+    # Adds parse time and counters of a file to the profile. A file
+    # that could not be parsed stops BASTA (the error is already shown).
+    def _parsed_hits(self,hits,prof):
+        if hits is None:
+            sys.exit()
+        (ids,counters,wall,cpu) = hits
+        if prof:
+            prof.stages['parse'].add(wall,cpu)
+            for c in counters:
+                prof.counters[c] += counters[c]
+        return ids
+
+
+    # Estimate one LCA based on all hits of a file, given as the number
+    # of hits of each hit ID in the order the IDs were first read. Each
+    # ID is looked up once and only the number of hits per taxonomy is
+    # kept, which gives the same LCA as the taxonomies of all hits.
+    def _file_lca(self,ids,tax_lookup,map_lookup,prof=None):
+        counts = ttree.LineageCounts()
+        missing = self.missing
+        for (hit_id,n) in ids.items():
+            taxon_id = map_lookup.get(hit_id)
+            if not taxon_id:
+                missing.add_mapping(hit_id,n)
+                continue
+            tax_string = tax_lookup.get(taxon_id)
+            if not tax_string:
+                missing.add_taxon(taxon_id,n)
+                continue
+            if tax_string.startswith(b"unknown;unknown;unknown;unknown;unknown;unknown;"):
+                continue
+            counts.append(tax_string,n)
+        get_lcs = prof.timed("lca",counts.lca) if prof else counts.lca
+        lca = get_lcs(self.minimum,self.lazy,self.method)
+        return (lca,counts)
+
+
+    # Databases are opened unless lookups were set (e.g. kept open by
+    # a server). The bloom filter is applied either way.
+    def _get_lookups(self,db_file,prof=None):
+        (tax_lookup,map_lookup) = self.lookups or db.open_lookups(self.directory,db_file,self.shared)
+        return self._timed_lookups(prof,tax_lookup,self._bloom_lookup(map_lookup,db_file))
+
+
+    # Accessions rejected by the bloom filter of the mapping
+    # database (if it has one) are not looked up
+    def _bloom_lookup(self,map_lookup,db_file):
+        bloom = db.open_bloom(os.path.join(self.directory,db_file))
+        if not bloom:
+            return map_lookup
+        self.bloom_lookup = BloomFilter.BloomLookup(map_lookup,bloom)
+        return self.bloom_lookup
+
+
+    def _timed_lookups(self,prof,tax_lookup,map_lookup):
+        if not prof:
+            return (tax_lookup, map_lookup)
+        return (prof.timed_db("taxonomy_lookup",tax_lookup), prof.timed_db("mapping_lookup",map_lookup))
+
+
+    # Profiling (--profile) is set up per run. Without a profile file
+    # no profile is created and the stages run unwrapped.
+    def _init_profile(self,command):
+        self.profile = StageProfile.Profile(command) if self.profile_file else None
+        return self.profile
+
+
+    # Hit generator, LCA and output functions of a run,
+    # timed by the given profile if any
+    def _stage_funcs(self,prof,seqs=None,unit="queries"):
+        # the info file needs the tree of every query anyway
+        get_lca = self._memo_lca if self.lca_memo and not self.info_file else self._tree_lca
+        if not prof:
+            return (seqs,get_lca,self._print_info,self._query_writer())
+        return (prof.timed_iter("parse",seqs) if seqs is not None else None,
+                prof.timed("lca",get_lca),
+                prof.timed("output",self._print_info),
+                prof.timed("output",self._query_writer(prof,unit)))
+
+
+    # Function handling the result of one query: writes the output
+    # line (unless switched off) and counts the LCA for the abundance
+    # table and the profile. Plain _print if there is nothing to count.
+    def _query_writer(self,prof=None,unit="queries"):
+        if self.write_reads and self.abundance is None and not prof:
+            return self._print
+        write = self._print if self.write_reads else None
+        counts = self.abundance
+
+        def print_(fh,name,lca,best,taxa):
+            if write:
+                write(fh,name,lca,best,taxa)
+            if counts is not None:
+                counts.add(lca)
+            if prof:
+                prof.count_query(lca,unit)
+        return print_
+
+
+    # LCA and the tree it was estimated from
+    def _tree_lca(self,taxa):
+        tree = self._getTT(taxa)
+        return (self._getLCS(taxa,tree),tree)
 
 
-    def _get_lookups(self,db_file):
-        self.logger.info("\n# [BASTA STATUS] Initializing taxonomy database")
-        tax_lookup = db._init_db(os.path.join(self.directory,"complete_taxa.db"))
-        self.logger.info("\n# [BASTA STATUS] Initializing mapping database")
-        map_lookup = db._init_db(os.path.abspath(os.path.join(self.directory,db_file)))
-        return (tax_lookup, map_lookup)
+    # Memoized LCA, no tree is returned
+    def _memo_lca(self,taxa):
+        return (self.lca_memo.get_lca(taxa,self.minimum,self.lazy,self.method),None)
+
+
+    def _write_abundance(self):
+        if self.abundance is not None:
+            self.abundance.write(self.abundance_file)
+            self.logger.info("\n# [BASTA STATUS] Abundance table written to %s" % (self.abundance_file))
+
+
+    def _report_memo(self):
+        m = self.lca_memo
+        if not m or not m.hits + m.misses:
+            return
+        self.logger.info("\n# [BASTA STATUS] LCA cache: %d hits, %d misses (%.1f%% hit rate)" % (m.hits,m.misses,m.rate()*100))
+        if self.profile:
+            self.profile.counters['lca_memo_hits'] = m.hits
+            self.profile.counters['lca_memo_misses'] = m.misses
+
+
+    def _write_profile(self):
+        if self.profile:
+            self.profile.write(self.profile_file,self.missing)
+            self.logger.info("\n# [BASTA STATUS] Profile written to %s" % (self.profile_file))
 
 
     def _print(self,fh,name,lca,best,taxa):
         if best:
             try:
-                fh.write("%s\t%s\t%s\n" % (name,lca,taxa[0]))
+                fh.write(b"%s\t%s\t%s\n" % (name,lca,taxa[0]))
             except IndexError:
-                fh.write("%s\t%s\t%s\n" % (name,lca,"Unknown"))
+                fh.write(b"%s\t%s\t%s\n" % (name,lca,b"Unknown"))
         else:
-            fh.write("%s\t%s\n" % (name,lca))
+            fh.write(b"%s\t%s\n" % (name,lca))
 
 
-    def _print_info(self,taxa,seq):
-        ttree = self._getTT(taxa)
-        if os.path.exists(self.info_file):
-            inf = open(self.info_file,"a")
-        else:
-            inf = open(self.info_file,"w")
-        inf.write("###%s\n" % (seq))
-        self._print_info_branch("",ttree.tree,inf)
-        inf.write("\n\n")
-        inf.close()
-    
-    def _print_info_branch(self,ts,t,info_file):
-        for b in t:
-            if b == "count":
-                info_file.write("%d\t%s\n" % (t["count"],ts))
-            else:
-                self._print_info_branch(ts + b + ";",t[b],info_file)
-       
+    # The info file is opened once per run and appended to. The
+    # tree built for the LCA is passed in to avoid building it twice.
+    def _print_info(self,taxa,seq,tree=None):
+        if not self.info_writer:
+            self.info_writer = futils.InfoWriter(self.info_file,self.info_format)
+        self.info_writer.write(seq,tree or self._getTT(taxa))
+
+
+    def _close_info(self):
+        if self.info_writer:
+            self.info_writer.close()
+            self.info_writer = None
             
     
-    def _getLCS(self,l):
-        tree = self._getTT(l)
-        minimum = 0;
-        if self.lazy:
-            minimum = min(self.minimum,len(l))
-        else:
-            minimum = self.minimum
-        taxon = tree.lca(minimum,len(l),self.method)
-        return taxon
+    def _getLCS(self,l,tree=None):
+        if tree is None:
+            return ttree.get_lca(l,self.minimum,self.lazy,self.method)
+        return ttree.tree_lca(tree,len(l),self.minimum,self.lazy,self.method)
 
 
     def _getTT(self,l):
-        tt = ttree.TTree()
-        for item in l:
-            tt.add_taxon(tt.tree,item)
-        return tt
+        return ttree.build_tree(l)
 
 
-    def _get_tax_list(self,hits,map_lookup,tax_lookup,taxa,nofo_map):
-        for hit in hits:
-            taxon_id = map_lookup.get(hit['id'])
+    # If early is set the remaining hits are not looked up once the
+    # LCA of the query is decided (see TaxTree.LCAAccumulator). The LCA
+    # of the partial list is the same as of the complete one.
+    def _get_tax_list(self,hits,map_lookup,tax_lookup,taxa,missing,early=False):
+        acc = ttree.LCAAccumulator(self.method) if early else None
+        for (i,hit) in enumerate(hits):
+            taxon_id = map_lookup.get(hit.id)
             if not taxon_id:
-                if not hit['id'] in nofo_map:
-                    self.logger.warning("\n# [BASTA WARNING] No mapping found for %s" % (hit['id']))
-                    nofo_map.append(hit['id'])
+                missing.add_mapping(hit.id)
                 continue
             tax_string = tax_lookup.get(taxon_id)
             if not tax_string:
-                if not taxon_id in nofo_map:
-                    self.logger.warning("\n# [BASTA WARNING] No taxon found for %d" % (int(taxon_id)))
-                    nofo_map.append(taxon_id)
-                    continue
-            if tax_string.startswith("unknown;unknown;unknown;unknown;unknown;unknown;"):
+                missing.add_taxon(taxon_id)
+                continue
+            if tax_string.startswith(b"unknown;unknown;unknown;unknown;unknown;unknown;"):
                 continue 
             taxa.append(tax_string)
+            if acc and acc.add(tax_string):
+                self.skipped_hits += len(hits) - i - 1
+                return
+
+
+    # Early termination needs neither all taxa (info file)
+    # nor all missing IDs (missing file)
+    def _early_stop(self):
+        return self.method == 'all' and not self.info_file and not self.missing_file
+
+
+    def _report_missing(self):
+        self.missing.report(self.logger)
+        if self.missing_file:
+            self.missing.write(self.missing_file)
+        self._report_bloom()
+        if self.skipped_hits:
+            self.logger.info("\n# [BASTA STATUS] Skipped lookups of %d hits of queries whose LCA was already decided" % (self.skipped_hits))
+        if self.profile:
+            self.profile.counters['hits_skipped'] = self.skipped_hits
+
+
+    def _report_bloom(self):
+        b = self.bloom_lookup
+        if not b:
+            return
+        self.logger.info("\n# [BASTA STATUS] Bloom filter: %d of %d mapping lookups rejected, %d false positives (observed false positive rate %.4f, configured %g)" % (b.rejected,b.lookups,b.false_positives,b.observed_fpr(),b.bloom.fpr))
+        if self.profile:
+            self.profile.counters['bloom_rejected'] = b.rejected
+            self.profile.counters['bloom_false_positives'] = b.false_positives
+            self.profile.counters['bloom_fpr_configured'] = b.bloom.fpr
+            self.profile.counters['bloom_fpr_observed'] = b.observed_fpr()
 
                     
     def _read_config(self,cp):
@@ -190,7 +523,7 @@ class Assigner():
 
         for m in mandatory:
             if m not in config:
-                self.logger.error("# [BASTA ERROR] No index field defined for %s in %s!" % (b,cp))
+                self.logger.error("# [BASTA ERROR] No index field defined for %s in %s!" % (m,cp))
                 sys.exit()
         return config
     
@@ -198,3 +531,161 @@ class Assigner():
     def _init_default_config(self):
         return {'query_id':0,'subject_id':1,'evalue':10,'align_length':3,'pident':2}
 
+
+
+# Number of hits of each hit ID of a file in the order the IDs were
+# first read, the parse counters (if profile is set) and the wall and
+# CPU time spent. Runs in the worker processes of 'basta multiple',
+# which must return: a file that can not be parsed returns None.
+def _file_hits(blast,alen,evalue,identity,config,num,profile=False):
+    start = time.time()
+    cpu = StageProfile.cpu_time()
+    counters = StageProfile.Profile().counters if profile else None
+    ids = OrderedDict()
+    try:
+        for seq_hits in futils.hit_gen(blast,alen,evalue,identity,config,num,counters):
+            for seq in seq_hits:
+                for hit in seq_hits[seq]:
+                    ids[hit.id] = ids.get(hit.id,0) + 1
+    except SystemExit:
+        return None
+    return (ids,counters or {},time.time()-start,StageProfile.cpu_time()-cpu)
+
+
+
+# Lineage of a sweep hit that was not looked up yet
+_UNRESOLVED = object()
+
+
+class SweepSetting():
+    """One parameter combination of 'basta sweep'. Hits of the loosest
+    parse are filtered with the setting's thresholds and grouped by
+    query like FileUtils.hit_gen would group them for this setting."""
+
+    def __init__(self,identity,evalue,alen,num,minimum,method,output):
+        self.identity = identity
+        self.evalue = evalue
+        self.alen = alen
+        self.num = num
+        self.minimum = minimum
+        self.method = method
+        self.output = output
+        self.seq = None
+        self.entries = []
+
+    def name(self):
+        return "identity %g, evalue %g, alen %d, number %d, minimum %d, method %s" % (self.identity,self.evalue,self.alen,self.num,self.minimum,self.method)
+
+    # Returns the (query,hits) group finished by a hit of another query
+    def add(self,seq,entry):
+        hit = entry[0]
+        if hit.identity < self.identity or hit.evalue > self.evalue or hit.alen < self.alen:
+            return None
+        if seq != self.seq:
+            group = self.flush()
+            self.seq = seq
+            self.entries = [entry]
+            return group
+        if not self.num or len(self.entries) < self.num:
+            self.entries.append(entry)
+        return None
+
+    def flush(self):
+        if self.seq is None:
+            return None
+        group = (self.seq,self.entries)
+        self.seq = None
+        self.entries = []
+        return group
+
+
+class MissingIDs():
+    """Accessions without mapping and taxon IDs without taxonomy"""
+
+    def __init__(self):
+        self.mappings = set()
+        self.taxa = set()
+        self.mapping_hits = 0
+        self.taxon_hits = 0
+
+    def add_mapping(self,acc,hits=1):
+        self.mapping_hits += hits
+        self.mappings.add(acc)
+
+    def add_taxon(self,taxon_id,hits=1):
+        self.taxon_hits += hits
+        self.taxa.add(taxon_id)
+
+    def as_dict(self):
+        return {'mappings':[Checkpoint.encode(m) for m in sorted(self.mappings)],'taxa':[Checkpoint.encode(t) for t in sorted(self.taxa)],'mapping_hits':self.mapping_hits,'taxon_hits':self.taxon_hits}
+
+    def restore(self,d):
+        self.mappings = set(Checkpoint.decode(m) for m in d['mappings'])
+        self.taxa = set(Checkpoint.decode(t) for t in d['taxa'])
+        self.mapping_hits = d['mapping_hits']
+        self.taxon_hits = d['taxon_hits']
+
+    def update(self,other):
+        self.mappings.update(other.mappings)
+        self.taxa.update(other.taxa)
+        self.mapping_hits += other.mapping_hits
+        self.taxon_hits += other.taxon_hits
+
+    def report(self,logger):
+        if self.mappings:
+            logger.warning("\n# [BASTA WARNING] No mapping found for %d accessions (%d hits)" % (len(self.mappings),self.mapping_hits))
+        if self.taxa:
+            logger.warning("\n# [BASTA WARNING] No taxon found for %d taxon IDs (%d hits)" % (len(self.taxa),self.taxon_hits))
+
+    # One "mapping<TAB>accession" or "taxon<TAB>taxon_id" line per missing ID
+    def write(self,out):
+        with open(out,"wb") as f:
+            for m in sorted(self.mappings):
+                f.write(b"mapping\t%s\n" % (m))
+            for t in sorted(self.taxa):
+                f.write(b"taxon\t%s\n" % (t))
+
+
+
+class Abundance():
+    """Number of queries assigned to each taxon, counted per LCA while
+    assigning and summed up for every rank when written"""
+
+    RANKS = [b'superkingdom',b'phylum',b'class',b'order',b'family',b'genus',b'species']
+
+    def __init__(self):
+        self.lcas = {}
+
+    def add(self,lca):
+        self.lcas[lca] = self.lcas.get(lca,0) + 1
+
+    # Returns {taxon: [rank depth, queries in clade, queries assigned to taxon]}
+    # with taxa given as lineage up to their rank, e.g. "Bacteria;Firmicutes;"
+    def clades(self):
+        clades = {}
+        for lca in self.lcas:
+            count = self.lcas[lca]
+            if lca == b"Unknown":
+                continue
+            taxon = b""
+            parts = [x for x in lca.split(b";") if x]
+            for (i,p) in enumerate(parts):
+                taxon += p + b";"
+                if taxon not in clades:
+                    clades[taxon] = [i,0,0]
+                clades[taxon][1] += count
+            clades[taxon][2] += count
+        return clades
+
+    # One "rank<TAB>taxon<TAB>queries<TAB>lca_queries" line per taxon, ordered
+    # by rank and number of queries. Unassigned queries are reported as Unknown.
+    def write(self,out):
+        clades = self.clades()
+        with futils.open_binary(out,"wb") as f:
+            f.write(b"#rank\ttaxon\tqueries\tlca_queries\n")
+            unknown = self.lcas.get(b"Unknown",0)
+            f.write(b"unassigned\tUnknown\t%d\t%d\n" % (unknown,unknown))
+            for taxon in sorted(clades,key=lambda t: (clades[t][0],-clades[t][1],t)):
+                (depth,queries,lca_queries) = clades[taxon]
+                rank = self.RANKS[depth] if depth < len(self.RANKS) else b"rank_%d" % (depth+1)
+                f.write(b"%s\t%s\t%d\t%d\n" % (rank,taxon,queries,lca_queries))
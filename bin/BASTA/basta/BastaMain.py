@@ -5,6 +5,7 @@ import os
 import logging
 import plyvel
 import argparse
+from itertools import product
 from subprocess import call
 
 # Quick'n'Dirty! Change!
@@ -12,8 +13,11 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from basta import FileUtils as futils
 from basta import TaxTree as ttree
 from basta import AssignTaxonomy
+from basta import AssignServer
+from basta import StageProfile
 from basta import DownloadUtils as dutils
 from basta import DBUtils as dbutils
+from basta import SortedIndex
 from basta import NCBITaxonomyCreator as ntc 
 
 
@@ -67,33 +71,86 @@ class Main():
                 self.logger.error("\n[BASTA ERROR] Couldn't find complete_taxa.db in %s. Did you run initial \'basta download\'?" % (args.directory))
                 sys.exit()
             self._basta_multiple(args)
+        elif args.subparser_name == 'sweep':
+            if not dbutils._check_complete(args.directory):
+                self.logger.error("\n[BASTA ERROR] Couldn't find complete_taxa.db in %s. Did you run initial \'basta download\'?" % (args.directory))
+                sys.exit()
+            self._basta_sweep(args)
+        elif args.subparser_name == 'serve':
+            if not dbutils._check_complete(args.directory):
+                self.logger.error("\n[BASTA ERROR] Couldn't find complete_taxa.db in %s. Did you run initial \'basta download\'?" % (args.directory))
+                sys.exit()
+            self._basta_serve(args)
+        elif args.subparser_name == 'submit':
+            self._basta_submit(args)
         elif args.subparser_name == 'download':
             self._basta_download(args)
         elif args.subparser_name == 'create_db':
             self._basta_create_db(args)
+        elif args.subparser_name == 'join':
+            self._basta_join(args)
         elif args.subparser_name == 'taxonomy':
             self._basta_taxonomy(args)
 
 
     def _basta_sequence(self,args):
         self.logger.info("\n#### Assigning taxonomy to each sequence ###\n")
+        self._check_no_output(args)
         db_file = dbutils.get_db_name(args.directory,args.type)
         assigner = AssignTaxonomy.Assigner(args.evalue,args.alen,args.identity,args.number,args.minimum,args.lazy,args.tax_method,args.directory,args.config_path,args.output)
+        assigner.shared = args.shared
         if args.verbose:
             assigner.info_file = args.verbose
+            assigner.info_format = args.verbose_format
+        if args.missing:
+            assigner.missing_file = args.missing
+        if args.profile:
+            assigner.profile_file = args.output + StageProfile.SUFFIX
+        assigner.processes = args.processes
+        if args.abundance:
+            assigner.abundance_file = args.abundance
+        assigner.write_reads = not args.no_output
+        if args.lca_cache:
+            assigner.lca_memo = ttree.LCAMemo(args.lca_cache)
+        self._check_checkpoint(args)
+        assigner.checkpoint_interval = args.checkpoint
+        assigner.resume = args.resume
         assigner._assign_sequence(args.blast,db_file,args.best_hit)
-        self.logger.info("\n#### Done. Output written to %s" % (args.output))
+        self.logger.info("\n#### Done. Output written to %s" % (args.abundance if args.no_output else args.output))
+
+
+    def _check_no_output(self,args):
+        if args.no_output and not args.abundance:
+            self.logger.error("\n[BASTA ERROR] No output would be written: -O/--no_output requires an abundance file (-A)")
+            sys.exit()
+
+
+    def _check_checkpoint(self,args):
+        if not args.checkpoint and not args.resume:
+            return
+        if args.processes:
+            self.logger.error("\n[BASTA ERROR] Checkpoints (-K/-R) can not be used with -p/--processes")
+            sys.exit()
+        if args.output.endswith(".gz"):
+            self.logger.error("\n[BASTA ERROR] Checkpoints (-K/-R) need an uncompressed output file")
+            sys.exit()
 
 
     def _basta_single(self,args):
         self.logger.info("\n#### Assigning one taxonomy based on all sequences ###\n")
         db_file = dbutils.get_db_name(args.directory,args.type)
         assigner = AssignTaxonomy.Assigner(args.evalue,args.alen,args.identity,args.number,args.minimum,args.lazy,args.tax_method,args.directory,args.config_path,args.output) 
+        assigner.shared = args.shared
         if args.verbose:
             assigner.info_file = args.verbose
+            assigner.info_format = args.verbose_format
+        if args.missing:
+            assigner.missing_file = args.missing
+        if args.profile:
+            assigner.profile_file = args.output + StageProfile.SUFFIX
         lca = assigner._assign_single(args.blast,db_file,args.best_hit)
         self.logger.info("\n##### Results ("+ args.tax_method +")#####\n")
-        self.logger.info("Last Common Ancestor: %s\n" % (lca))
+        self.logger.info("Last Common Ancestor: %s\n" % (futils.to_str(lca)))
         self.logger.info("\n###################\n")
 
         
@@ -102,14 +159,72 @@ class Main():
         db_file = ""
         db_file = dbutils.get_db_name(args.directory,args.type)
         assigner = AssignTaxonomy.Assigner(args.evalue,args.alen,args.identity,args.number,args.minimum,args.lazy,args.tax_method,args.directory,args.config_path,args.output)
+        assigner.shared = args.shared
         if args.verbose:
             assigner.info_file = args.verbose
-        assigner._assign_multiple(args.blast,db_file,args.best_hit)
+            assigner.info_format = args.verbose_format
+        if args.missing:
+            assigner.missing_file = args.missing
+        if args.profile:
+            assigner.profile_file = args.output + StageProfile.SUFFIX
+        assigner._assign_multiple(args.blast,db_file,args.best_hit,args.workers)
         self.logger.info("\n###### Done. Output written to %s" % (args.output))
 
 
 
+    def _basta_sweep(self,args):
+        self.logger.info("\n#### Assigning taxonomy to each sequence for every combination of parameters ###\n")
+        db_file = dbutils.get_db_name(args.directory,args.type)
+        settings = []
+        for (i,e,l,n,m,t) in product(args.identity,args.evalue,args.alen,args.number,args.minimum,args.tax_method):
+            out = "%s.i%g_e%g_l%d_n%d_m%d_%s" % (args.output,i,e,l,n,m,t)
+            settings.append(AssignTaxonomy.SweepSetting(i,e,l,n,m,t,out))
+        assigner = AssignTaxonomy.Assigner(max(args.evalue),min(args.alen),min(args.identity),0,0,args.lazy,"all",args.directory,args.config_path,args.output)
+        assigner.shared = args.shared
+        if args.missing:
+            assigner.missing_file = args.missing
+        if args.lca_cache:
+            assigner.lca_memo = ttree.LCAMemo(args.lca_cache)
+        assigner._assign_sweep(args.blast,db_file,args.best_hit,settings)
+        self.logger.info("\n#### Done. Output written to %d files %s.*" % (len(settings),args.output))
+
+
+    def _basta_serve(self,args):
+        self.logger.info("\n#### Starting BASTA server ###\n")
+        server = AssignServer.Server(args.directory,args.socket,args.cache*1024*1024)
+        server.serve()
+        self.logger.info("\n#### Server stopped")
+
+
+    def _basta_submit(self,args):
+        self._check_no_output(args)
+        job = {'evalue':args.evalue,'alen':args.alen,'identity':args.identity,'number':args.number,'minimum':args.minimum,'lazy':args.lazy,'tax_method':args.tax_method,'config_path':os.path.abspath(args.config_path) if args.config_path else 0,'best_hit':args.best_hit,'type':args.type,'output':os.path.abspath(args.output),'verbose':os.path.abspath(args.verbose) if args.verbose else None,'verbose_format':args.verbose_format,'missing':os.path.abspath(args.missing) if args.missing else None,'profile':args.profile,'lca_cache':args.lca_cache,'abundance':os.path.abspath(args.abundance) if args.abundance else None,'no_output':args.no_output}
+        hits = None
+        if args.blast == "-":
+            job['blast'] = None
+            hits = sys.stdin.buffer if hasattr(sys.stdin,"buffer") else sys.stdin
+        else:
+            job['blast'] = os.path.abspath(args.blast)
+        reply = AssignServer.submit(args.socket,job,hits)
+        if reply['status'] != 'ok':
+            self.logger.error("\n[BASTA ERROR] Server job failed: %s" % (reply['message']))
+            sys.exit(1)
+        self.logger.info("\n#### Done. Output written to %s" % (reply['output']))
+
+
+
+    # the sorted index has no bloom filter
+    def _check_fpr(self,args,index=False):
+        if not 0 <= args.bloom_fpr < 1:
+            self.logger.error("\n[BASTA ERROR] The false positive rate of the bloom filter (-B) must be at least 0 and less than 1")
+            sys.exit()
+        if index and args.bloom_fpr:
+            self.logger.error("\n[BASTA ERROR] A sorted index (-I or output ending in .idx) can not have a bloom filter (-B)")
+            sys.exit()
+
+
     def _basta_download(self,args):
+        self._check_fpr(args,args.index)
         if not os.path.exists(args.directory):
             os.makedirs(args.directory)
         self.logger.info("\n##### Downloading and processing mapping file(s) from NCBI ###\n")
@@ -133,21 +248,44 @@ class Main():
             map_file = "nucl_gb.accession2taxid.gz"
             db_file = "gb_mapping.db"
 
+        if args.index:
+            db_file = db_file[:-len(".db")] + ".idx"
         self.logger.info("\n# [BASTA STATUS] Downloading mapping files\n")
         dutils.down_and_check(args.ftp,map_file,args.directory)
         self.logger.info("\n# [BASTA STATUS] Creating mapping database\n")
-        dbutils.create_db(args.directory,map_file,db_file,0,2)
+        dbutils.create_db(args.directory,map_file,db_file,0,2,args.bloom_fpr,args.backend)
+        if args.join:
+            self._join(args.directory,args.type)
         self.logger.info("\n##### Done. Downloaded and processed file %s\n" % (map_file))
 
 
     def _basta_create_db(self,args):
+        self._check_fpr(args,args.output.endswith(SortedIndex.SUFFIX))
         if not os.path.exists(args.directory):
             os.makedirs(args.directory)
+        if args.join and not args.output.endswith("_mapping.db"):
+            self.logger.error("\n[BASTA ERROR] -j/--join requires a mapping database named TYPE_mapping.db")
+            sys.exit()
         self.logger.info("\n#### Creating database\n")
-        dbutils.create_db(args.directory,args.input,args.output,args.key,args.value)
+        dbutils.create_db(args.directory,args.input,args.output,args.key,args.value,args.bloom_fpr,args.backend)
+        if args.join:
+            self._join(args.directory,args.output[:-len("_mapping.db")])
         self.logger.info("\n#### Done. Processed file %s\n" % (args.input))
 
 
+    def _basta_join(self,args):
+        self.logger.info("\n#### Building lineage database\n")
+        self._join(args.directory,args.type)
+        self.logger.info("\n#### Done. Lineage database written to %s" % (os.path.join(args.directory,dbutils.get_lineage_db_name(args.type))))
+
+
+    def _join(self,directory,db_type):
+        if not dbutils._check_complete(directory):
+            self.logger.error("\n[BASTA ERROR] Couldn't find complete_taxa.db in %s. Did you run initial \'basta taxonomy\'?" % (directory))
+            sys.exit()
+        dbutils.create_lineage_db(directory,db_type)
+
+
     def _basta_taxonomy(self,args):
         if not os.path.exists(args.output):
             os.makedirs(args.output)
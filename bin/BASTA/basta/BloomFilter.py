@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+import os
+import mmap
+import math
+import json
+import struct
+import hashlib
+
+
+############
+#
+#   Bloom filter of the keys of a mapping database. Accessions
+#   that are not in the database are rejected in memory instead
+#   of probing every level of the LevelDB store.
+#
+####
+#   COPYRIGHT DISCLAIMER:
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   Author: BASTA contributors
+#   Date:   October 2026
+#
+
+
+MAGIC = b"BASTA_BLOOM 1\n"
+
+_HASH = struct.Struct("<QQ")
+_BYTE = struct.Struct("<B")
+
+
+class BloomFilter():
+    """Bit array of m bits with k positions per key, derived from one
+    MD5 digest by double hashing. Sized for n keys at the given false
+    positive rate. A filter read from a file keeps its bits in the
+    mmap of the file at offset, shared by all processes using it."""
+
+    def __init__(self,n,fpr,m=None,k=None,bits=None,offset=0):
+        n = max(1,n)
+        self.n = n
+        self.fpr = fpr
+        self.m = m or max(8,int(math.ceil(-n * math.log(fpr) / (math.log(2) ** 2))))
+        self.k = k or max(1,int(round(float(self.m) / n * math.log(2))))
+        self.bits = bytearray((self.m + 7) // 8) if bits is None else bits
+        self.offset = offset
+        self.version = None
+
+    def _positions(self,key):
+        (h1,h2) = _HASH.unpack(hashlib.md5(key).digest())
+        m = self.m
+        return [(h1 + i * h2) % m for i in range(self.k)]
+
+    def add(self,key):
+        bits = self.bits
+        for p in self._positions(key):
+            bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self,key):
+        bits = self.bits
+        offset = self.offset
+        for p in self._positions(key):
+            if not _BYTE.unpack_from(bits,offset + (p >> 3))[0] & (1 << (p & 7)):
+                return False
+        return True
+
+    # False positive rate expected for n keys
+    def expected_fpr(self):
+        return (1 - math.exp(-float(self.k) * self.n / self.m)) ** self.k
+
+    def write(self,path):
+        with open(path,"wb") as f:
+            f.write(MAGIC)
+            f.write(json.dumps({'n':self.n,'fpr':self.fpr,'m':self.m,'k':self.k,'version':self.version}).encode() + b"\n")
+            f.write(self.bits)
+
+
+
+def read(path):
+    with open(path,"rb") as f:
+        if f.readline() != MAGIC:
+            raise ValueError("%s is not a BASTA bloom filter" % (path))
+        h = json.loads(f.readline().decode())
+        offset = f.tell()
+        if os.fstat(f.fileno()).st_size - offset < (h['m'] + 7) // 8:
+            raise ValueError("%s is truncated" % (path))
+        bits = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+        bloom = BloomFilter(h['n'],h['fpr'],h['m'],h['k'],bits,offset)
+        bloom.version = h['version']
+    return bloom
+
+
+
+class BloomLookup():
+    """Database handle whose get() only reaches the database for keys
+    that pass the filter. Counts rejected keys and false positives."""
+
+    def __init__(self,lookup,bloom):
+        self.lookup = lookup
+        self.bloom = bloom
+        self.lookups = 0
+        self.rejected = 0
+        self.false_positives = 0
+
+    def get(self,key):
+        self.lookups += 1
+        if key not in self.bloom:
+            self.rejected += 1
+            return None
+        value = self.lookup.get(key)
+        if value is None:
+            self.false_positives += 1
+        return value
+
+    # Fraction of keys not in the database that passed the filter
+    def observed_fpr(self):
+        negatives = self.rejected + self.false_positives
+        return float(self.false_positives) / negatives if negatives else 0.0
+
+    def __getattr__(self,name):
+        return getattr(self.lookup,name)
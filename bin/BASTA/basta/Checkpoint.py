@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+import os
+import time
+import json
+import timeit
+
+
+############
+#
+#   Checkpoints of long running 'basta sequence' jobs: the input
+#   offset of the next query, the length of the output written so far
+#   and the counters of the run, written as a JSON file next to the
+#   BASTA output so that an interrupted run can be resumed (--resume)
+#
+####
+#   COPYRIGHT DISCLAIMER:
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   Author: BASTA contributors
+#   Date:   October 2026
+#
+
+
+# Suffix of the checkpoint file written next to the output file
+SUFFIX = ".checkpoint"
+
+VERSION = 1
+
+# Seconds between checkpoints of a resumed run that did not set any
+INTERVAL = 300
+
+
+class CheckpointError(Exception):
+    pass
+
+
+
+class Checkpoint():
+    """Checkpoint file of one run. settings are the parameters of the
+    run, a checkpoint is only resumed by a run with the same settings.
+    progress is passed to FileUtils.hit_gen, which keeps the offset
+    of the next query in it."""
+
+    def __init__(self,path,interval,settings):
+        self.path = path
+        self.interval = interval
+        self.settings = json.loads(json.dumps(settings))
+        self.progress = {'offset':0}
+        self.state = None
+        self.last = timeit.default_timer()
+
+
+    # State of the interrupted run or None if there is no checkpoint.
+    # A run without interval uses the one of the checkpoint, else INTERVAL
+    def read(self):
+        try:
+            with open(self.path,"r") as f:
+                state = json.load(f)
+        except (IOError,OSError):
+            self.interval = self.interval or INTERVAL
+            return None
+        except ValueError:
+            raise CheckpointError("Checkpoint %s is damaged" % (self.path))
+        if state.get('version') != VERSION:
+            raise CheckpointError("Checkpoint %s was written by another version of BASTA" % (self.path))
+        if state['settings'] != self.settings:
+            diff = sorted(k for k in set(state['settings']) | set(self.settings) if state['settings'].get(k) != self.settings.get(k))
+            raise CheckpointError("Checkpoint %s was written with other settings (%s)" % (self.path,", ".join(diff)))
+        self.interval = self.interval or state['interval'] or INTERVAL
+        self.progress['offset'] = state['offset']
+        self.state = state
+        return state
+
+
+    def due(self):
+        return timeit.default_timer() - self.last >= self.interval
+
+
+    # Written to a temporary file first, so that a run killed while
+    # writing leaves the previous checkpoint
+    def write(self,state):
+        state = dict(state)
+        state.update({'version':VERSION,'created':time.strftime("%Y-%m-%dT%H:%M:%S"),'interval':self.interval,'settings':self.settings,'offset':self.progress['offset']})
+        tmp = self.path + ".tmp"
+        with open(tmp,"w") as f:
+            json.dump(state,f,indent=2,sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp,self.path)
+        self.last = timeit.default_timer()
+
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+
+# Bytes (accessions, taxa) in JSON, without loss whatever their encoding
+def encode(b):
+    return b.decode("latin-1")
+
+
+def decode(s):
+    return s.encode("latin-1")
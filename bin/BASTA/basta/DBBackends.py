@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import sqlite3
+import threading
+import plyvel
+
+try:
+    from urllib import quote
+except ImportError:
+    from urllib.parse import quote
+
+# LMDB is optional
+try:
+    import lmdb
+except ImportError:
+    lmdb = None
+
+
+############
+#
+#   Storage backends of the key-value databases. Every backend stores
+#   a database in a directory and offers the same operations:
+#
+#     build(path,items)   bulk load (key,value) pairs, returns their number
+#     Store(path)         read-only handle with
+#       get(key,default=None)
+#       multi_get(keys)   list of values (None for missing keys)
+#       iterator(start=None,stop=None,include_value=True)
+#                         (key,value) pairs or keys in byte order
+#       close()
+#
+####
+#   COPYRIGHT DISCLAIMER:
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   Author: BASTA contributors
+#   Date:   October 2026
+#
+
+
+# Number of pairs written per batch/transaction while building
+_BATCH = 100000
+
+
+class LevelDBStore():
+    """plyvel database with the backend interface. get and iterator
+    are the ones of plyvel."""
+
+    def __init__(self,path,cache_size=None):
+        if cache_size:
+            self.db = plyvel.DB(path,lru_cache_size=cache_size)
+        else:
+            self.db = plyvel.DB(path)
+        self.get = self.db.get
+        self.iterator = self.db.iterator
+
+    @staticmethod
+    def build(path,items):
+        lookup = plyvel.DB(path,create_if_missing=True)
+        wb = lookup.write_batch()
+        n = 0
+        for (k,v) in items:
+            wb.put(k,v)
+            n += 1
+            if not n % _BATCH:
+                wb.write()
+                wb.clear()
+        wb.write()
+        lookup.close()
+        return n
+
+    def multi_get(self,keys):
+        return [self.db.get(k) for k in keys]
+
+    def __iter__(self):
+        return iter(self.db)
+
+    def close(self):
+        self.db.close()
+
+
+
+class SQLiteStore():
+    """Table kv(k,v) of an SQLite database that is never changed after
+    it is built. Readers open it immutable, so they neither lock nor
+    write anything and no snapshot is needed for several processes,
+    also in read-only directories. Each thread opens its own read-only
+    connection."""
+
+    FILE = "store.sqlite"
+
+    def __init__(self,path,cache_size=None):
+        self.file = os.path.join(path,self.FILE)
+        if not os.path.isfile(self.file):
+            raise IOError("No SQLite database in %s" % (path))
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def build(path,items):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        conn = sqlite3.connect(os.path.join(path,SQLiteStore.FILE))
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("CREATE TABLE IF NOT EXISTS kv (k BLOB PRIMARY KEY, v BLOB NOT NULL) WITHOUT ROWID")
+        n = 0
+        batch = []
+        for (k,v) in items:
+            batch.append((sqlite3.Binary(k),sqlite3.Binary(v)))
+            n += 1
+            if len(batch) >= _BATCH:
+                conn.executemany("INSERT OR REPLACE INTO kv VALUES (?,?)",batch)
+                batch = []
+        conn.executemany("INSERT OR REPLACE INTO kv VALUES (?,?)",batch)
+        conn.commit()
+        # WAL mode would make readers create -wal and -shm files
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+        return n
+
+    def _conn(self):
+        conn = getattr(self.local,"conn",None)
+        if conn is None:
+            try:
+                conn = sqlite3.connect("file:%s?mode=ro&immutable=1" % (quote(os.path.abspath(self.file))),uri=True,check_same_thread=False)
+            except TypeError:
+                # Python 2 has no URI file names
+                conn = sqlite3.connect(self.file,check_same_thread=False)
+            conn.execute("PRAGMA query_only=ON")
+            self.local.conn = conn
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    def get(self,key,default=None):
+        row = self._conn().execute("SELECT v FROM kv WHERE k=?",(sqlite3.Binary(key),)).fetchone()
+        return bytes(row[0]) if row else default
+
+    def multi_get(self,keys):
+        found = {}
+        conn = self._conn()
+        for i in range(0,len(keys),500):
+            chunk = keys[i:i+500]
+            sql = "SELECT k,v FROM kv WHERE k IN (%s)" % (",".join("?" * len(chunk)))
+            for (k,v) in conn.execute(sql,[sqlite3.Binary(k) for k in chunk]):
+                found[bytes(k)] = bytes(v)
+        return [found.get(k) for k in keys]
+
+    def iterator(self,start=None,stop=None,include_value=True):
+        where = []
+        args = []
+        if start is not None:
+            where.append("k>=?")
+            args.append(sqlite3.Binary(start))
+        if stop is not None:
+            where.append("k<?")
+            args.append(sqlite3.Binary(stop))
+        sql = "SELECT k,v FROM kv%s ORDER BY k" % (" WHERE " + " AND ".join(where) if where else "")
+        for (k,v) in self._conn().execute(sql,args):
+            if include_value:
+                yield (bytes(k),bytes(v))
+            else:
+                yield bytes(k)
+
+    def __iter__(self):
+        return self.iterator()
+
+    def close(self):
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+        self.local = threading.local()
+
+
+
+class LMDBStore():
+    """LMDB environment opened read-only without lock file. Each thread
+    keeps one read transaction."""
+
+    # Maximum size of the memory map (only reserves address space)
+    MAP_SIZE = 2**40 if sys.maxsize > 2**32 else 2**30
+
+    def __init__(self,path,cache_size=None):
+        _check_lmdb()
+        self.env = lmdb.open(path,readonly=True,lock=False,max_readers=1024)
+        self.local = threading.local()
+
+    @staticmethod
+    def build(path,items):
+        _check_lmdb()
+        env = lmdb.open(path,map_size=LMDBStore.MAP_SIZE)
+        n = 0
+        txn = env.begin(write=True)
+        for (k,v) in items:
+            txn.put(k,v)
+            n += 1
+            if not n % _BATCH:
+                txn.commit()
+                txn = env.begin(write=True)
+        txn.commit()
+        env.sync()
+        env.close()
+        return n
+
+    def _txn(self):
+        txn = getattr(self.local,"txn",None)
+        if txn is None:
+            txn = self.env.begin()
+            self.local.txn = txn
+        return txn
+
+    def get(self,key,default=None):
+        return self._txn().get(key,default)
+
+    def multi_get(self,keys):
+        txn = self._txn()
+        return [txn.get(k) for k in keys]
+
+    def iterator(self,start=None,stop=None,include_value=True):
+        cursor = self.env.begin().cursor()
+        ok = cursor.set_range(start) if start is not None else cursor.first()
+        while ok:
+            k = cursor.key()
+            if stop is not None and k >= stop:
+                break
+            yield (k,cursor.value()) if include_value else k
+            ok = cursor.next()
+        cursor.close()
+
+    def __iter__(self):
+        return self.iterator()
+
+    def close(self):
+        self.env.close()
+
+
+
+class BackendError(Exception):
+    pass
+
+
+def _check_lmdb():
+    if lmdb is None:
+        raise BackendError("The LMDB backend requires the Python package lmdb (pip install lmdb)")
+
+
+BACKENDS = {
+    'leveldb':LevelDBStore,
+    'sqlite':SQLiteStore,
+    'lmdb':LMDBStore,
+}
+
+
+# Backend of an existing database directory by its files
+def detect(path):
+    if os.path.isfile(os.path.join(path,SQLiteStore.FILE)):
+        return "sqlite"
+    if os.path.isfile(os.path.join(path,"data.mdb")):
+        return "lmdb"
+    return "leveldb"
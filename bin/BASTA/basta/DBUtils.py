@@ -2,12 +2,24 @@
 
 import sys
 import os
-import hashlib
+import re
+import errno
+import socket
+import shutil
+import atexit
+import tempfile
 import logging
 import plyvel
-import gzip
+import json
+import time
+import uuid
 import timeit
 
+from basta import FileUtils as futils
+from basta import BloomFilter
+from basta import SortedIndex
+from basta import DBBackends
+
 ############
 #
 #  Functions related to levelDB stuff
@@ -34,8 +46,10 @@ import timeit
 #
 
 
-def create_db(path,f,of,i1,i2):
+def create_db(path,f,of,i1,i2,fpr=0,backend="leveldb"):
 
+    if of.endswith(SortedIndex.SUFFIX):
+        return SortedIndex.create_index(path,f,of,i1,i2)
     of = _check_file_name(of)
 
     logger = logging.getLogger()
@@ -46,34 +60,192 @@ def create_db(path,f,of,i1,i2):
 
     op = os.path.join(path,of)
 
-    lookup = plyvel.DB(op, create_if_missing=True)
-    wb = lookup.write_batch()
+    i1 = int(i1)
+    i2 = int(i2)
     logger.info("\n# [BASTA STATUS] Reading mapping file\nThis might take a while, please be patient ...\n")
 
-    timetotal = 0
     try:
-        with (gzip.open(ip,"r") if ip.endswith(".gz") else open(ip,"r")) as f:
-            start_time = timeit.default_timer()
-            for count,line in enumerate(f):
-                if not count % 1000000:
-                    if not count:
-                        continue
-                    elapsed = timeit.default_timer() - start_time
-                    timetotal+=elapsed
-                    num = count/1000000
-                    logger.info("\n# [BASTA STATUS] %d lines processed (avg time: %fsec)" % (count,timetotal/num))
-                    start_time = timeit.default_timer()
-                ls = line.split()
-                lookup.put(ls[i1],ls[i2])
-            lookup.close()
+        f = futils.open_binary(ip)
     except IOError:
         logger.error("\n# [BASTA ERROR] No file %s: did you forget to download mapping file (parameter -d True)?" % (ip))
         sys.exit()
+    try:
+        with f:
+            count = DBBackends.BACKENDS[backend].build(op,_read_pairs(f,i1,i2))
+    except DBBackends.BackendError as e:
+        logger.error("\n# [BASTA ERROR] %s" % (e))
+        sys.exit()
+    _write_version(op,os.path.basename(ip),backend)
+    if fpr:
+        create_bloom(op,count,fpr)
+
+
+# (key,value) pairs of columns i1 and i2 of
+# all but the first line of a mapping file
+def _read_pairs(f,i1,i2):
+    logger = logging.getLogger()
+    timetotal = 0
+    start_time = timeit.default_timer()
+    for count,line in enumerate(f):
+        if not count % 1000000:
+            if not count:
+                continue
+            elapsed = timeit.default_timer() - start_time
+            timetotal+=elapsed
+            num = count/1000000
+            logger.info("\n# [BASTA STATUS] %d lines processed (avg time: %fsec)" % (count,timetotal/num))
+            start_time = timeit.default_timer()
+        ls = line.split()
+        yield (ls[i1],ls[i2])
+
+
+def _init_db(db,cache_size=None,shared=False):
+        path = os.path.abspath(db)
+        # indices are read-only files without lock
+        if path.endswith(SortedIndex.SUFFIX) and os.path.isfile(path):
+            return SortedIndex.SortedIndex(path)
+        # only LevelDB takes an exclusive lock
+        backend = db_backend(path)
+        if backend != "leveldb":
+            try:
+                return DBBackends.BACKENDS[backend](path,cache_size)
+            except DBBackends.BackendError as e:
+                logger = logging.getLogger()
+                logger.error("\n# [BASTA ERROR] %s" % (e))
+                sys.exit()
+        if shared:
+            path = _shared_snapshot(path)
+        try:
+            return DBBackends.LevelDBStore(path,cache_size)
+        except plyvel.IOError as e:
+            if "lock" not in str(e).lower():
+                raise
+            logger = logging.getLogger()
+            logger.error("\n# [BASTA ERROR] Database %s is used by another process. Use -S to open a private snapshot of it instead." % (path))
+            sys.exit()
+
+
+# LevelDB only ever writes new table files (.ldb/.sst) and never changes
+# them, so a snapshot hard links them and copies the small log and
+# manifest files. The original directory is left untouched, so any
+# number of processes can open their own snapshot at the same time.
+# If the database is changed while copying (e.g. opened by a process
+# without snapshot) the snapshot is taken again.
+# Snapshot directories are named [.]basta_snapshot_PID_HOST_XXXXXX
+SNAPSHOT_NAME = re.compile(r"^\.?basta_snapshot_(\d+)_([^_]+)_")
+
+
+def snapshot_db(db,dest,attempts=5):
+    for i in range(attempts):
+        current = _read_current(db)
+        try:
+            _copy_db(db,dest)
+            if _read_current(db) == current:
+                break
+        except (IOError,OSError):
+            pass
+        shutil.rmtree(dest,True)
+    else:
+        logger = logging.getLogger()
+        logger.error("\n# [BASTA ERROR] Database %s changed while taking a snapshot. Is it opened by another process without -S?" % (db))
+        sys.exit()
+    return dest
+
+
+def _read_current(db):
+    with open(os.path.join(db,"CURRENT"),"rb") as f:
+        return f.read()
 
 
-def _init_db(db):
-        lookup = plyvel.DB(os.path.abspath(db))
-        return lookup
+def _is_table(f):
+    return f.endswith(".ldb") or f.endswith(".sst")
+
+
+# Linking the table files was tested by _snapshot_dir, so a failing
+# link means that the database changed and the snapshot is taken again
+def _copy_db(db,dest):
+    os.makedirs(dest)
+    for f in sorted(os.listdir(db),key=lambda f: not _is_table(f)):
+        # the bloom filter is read from the original database
+        if f == "LOCK" or f.startswith("LOG") or f == BLOOM_FILE:
+            continue
+        src = os.path.join(db,f)
+        dst = os.path.join(dest,f)
+        if _is_table(f):
+            os.link(src,dst)
+        else:
+            shutil.copy2(src,dst)
+
+
+# Snapshot of the given database for this process. Removed when the
+# process exits, snapshots left by killed processes are removed by the
+# next process taking a snapshot.
+def _shared_snapshot(db):
+    _remove_stale_snapshots([tempfile.gettempdir(),os.path.dirname(db)])
+    tmp = _snapshot_dir(db)
+    atexit.register(shutil.rmtree,tmp,True)
+    logger = logging.getLogger()
+    logger.info("\n# [BASTA STATUS] Opening snapshot of %s in %s" % (db,tmp))
+    return snapshot_db(db,os.path.join(tmp,os.path.basename(db)))
+
+
+# Directory for the snapshot in TMPDIR or, if table files can not be
+# linked there, next to the database. Hard links need the same file
+# system and, with fs.protected_hardlinks, database files owned by the
+# user, so linking is tested with one table file before anything is
+# copied and fails with an error if it is possible in neither place.
+def _snapshot_dir(db):
+    tables = [f for f in os.listdir(db) if _is_table(f)]
+    prefix = "basta_snapshot_%d_%s_" % (os.getpid(),_host())
+    errors = []
+    for (d,p) in [(tempfile.gettempdir(),prefix),(os.path.dirname(db),"." + prefix)]:
+        try:
+            tmp = tempfile.mkdtemp(prefix=p,dir=d)
+        except OSError as e:
+            errors.append("%s: %s" % (d,e.strerror))
+            continue
+        try:
+            if tables:
+                probe = os.path.join(tmp,tables[0])
+                os.link(os.path.join(db,tables[0]),probe)
+                os.remove(probe)
+            return tmp
+        except OSError as e:
+            shutil.rmtree(tmp,True)
+            errors.append("%s: %s" % (d,e.strerror))
+    logger = logging.getLogger()
+    logger.error("\n# [BASTA ERROR] Could not link files of database %s into a snapshot (%s). -S needs a writable TMPDIR or database directory on the same file system as the database and database files owned by you. Run without -S or, for a shared read-only reference, store the databases with -b sqlite or -b lmdb or the mapping as sorted index (-I), which need no snapshot." % (db,"; ".join(errors)))
+    sys.exit()
+
+
+# Host name without '_' as snapshots of other hosts (e.g. databases on
+# a shared file system) can not be checked and are never removed
+def _host():
+    return socket.gethostname().replace("_","-")
+
+
+def _remove_stale_snapshots(dirs):
+    logger = logging.getLogger()
+    host = _host()
+    for d in dirs:
+        try:
+            names = os.listdir(d)
+        except OSError:
+            continue
+        for n in names:
+            m = SNAPSHOT_NAME.match(n)
+            if not m or m.group(2) != host or _is_running(int(m.group(1))):
+                continue
+            logger.info("\n# [BASTA STATUS] Removing snapshot %s of terminated process %s" % (os.path.join(d,n),m.group(1)))
+            shutil.rmtree(os.path.join(d,n),True)
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid,0)
+    except OSError as e:
+        return e.errno != errno.ESRCH
+    return True
 
 def _check_file_name(name):
     if not name.endswith(".db"):
@@ -83,8 +255,12 @@ def _check_file_name(name):
 
 
 
+# LevelDB mapping database TYPE_mapping.db or,
+# if there is none, index TYPE_mapping.idx
 def get_db_name(path,db_type):
     db_name = db_type + "_mapping.db"
+    if not os.path.isdir(os.path.join(path,db_name)) and os.path.isfile(os.path.join(path,db_type + "_mapping" + SortedIndex.SUFFIX)):
+        return db_type + "_mapping" + SortedIndex.SUFFIX
     if not os.path.isdir(os.path.join(path,db_name)):
         logger = logging.getLogger()
         logger.error("\n# [BASTA ERROR] No database %s found in %s. Did you forget to create the specified database or was it a typo?" % (db_name,path))
@@ -97,3 +273,212 @@ def _check_complete(path):
     else:
         return None 
 
+
+
+# Every database created by BASTA gets a random version ID in a file
+# inside its directory (LevelDB ignores files it did not create). The
+# lineage database records the versions it was built from.
+VERSION_FILE = "BASTA_VERSION"
+
+
+def _write_version(db,source,backend=None):
+    with open(os.path.join(db,VERSION_FILE),"w") as f:
+        json.dump({'id':uuid.uuid4().hex,'source':source,'created':time.strftime("%Y-%m-%d %H:%M:%S"),'backend':backend or DBBackends.detect(db)},f)
+
+
+def _read_version(db):
+    try:
+        with open(os.path.join(db,VERSION_FILE),"r") as f:
+            return json.load(f)
+    except (IOError,OSError,ValueError):
+        return {}
+
+
+def db_version(db):
+    return _read_version(db).get('id')
+
+
+# Storage backend of a database as recorded when it was created,
+# else guessed from its files
+def db_backend(db):
+    return _read_version(db).get('backend') or DBBackends.detect(db)
+
+
+# Bloom filter of the keys of a database, stored inside its directory
+# and tied to the database version it was built from
+BLOOM_FILE = "BASTA_BLOOM"
+
+
+def create_bloom(db,n,fpr):
+    logger = logging.getLogger()
+    logger.info("\n# [BASTA STATUS] Building bloom filter of %s (false positive rate %g)" % (db,fpr))
+    bloom = BloomFilter.BloomFilter(n,fpr)
+    lookup = _init_db(db)
+    for key in lookup.iterator(include_value=False):
+        bloom.add(key)
+    lookup.close()
+    bloom.version = db_version(db)
+    bloom.write(os.path.join(db,BLOOM_FILE + ".tmp"))
+    os.rename(os.path.join(db,BLOOM_FILE + ".tmp"),os.path.join(db,BLOOM_FILE))
+    logger.info("\n# [BASTA STATUS] Bloom filter: %d bits, %d hashes, %.1f MB" % (bloom.m,bloom.k,len(bloom.bits)/1e6))
+
+
+# Bloom filter of the given database or None if there is none
+# or it was built from another version of the database
+def open_bloom(db):
+    logger = logging.getLogger()
+    path = os.path.join(db,BLOOM_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        bloom = BloomFilter.read(path)
+    except ValueError as e:
+        logger.warning("\n# [BASTA WARNING] Bloom filter not used: %s" % (e))
+        return None
+    if bloom.version != db_version(db):
+        logger.warning("\n# [BASTA WARNING] Bloom filter %s was built from another version of the database and is not used" % (path))
+        return None
+    logger.info("\n# [BASTA STATUS] Using bloom filter %s (configured false positive rate %g, expected %g for %d keys)" % (path,bloom.fpr,bloom.expected_fpr(),bloom.n))
+    return bloom
+
+
+def get_lineage_db_name(db_type):
+    return db_type + "_lineage.db"
+
+
+# Keys of the lineage database besides the accessions. Accessions map to
+# b"#" + lineage ID, lineages are stored under b"\x00" + lineage ID. If
+# the taxon of an accession has no lineage its taxon ID is stored as is.
+_LINEAGE_PREFIX = b"\x00"
+_META_TAXONOMY = b"\x00meta:taxonomy"
+_META_MAPPING = b"\x00meta:mapping"
+
+
+# Join mapping and taxonomy database into one database that maps each
+# accession to the ID of its lineage. Each lineage is stored once.
+def create_lineage_db(path,db_type):
+    logger = logging.getLogger()
+    map_db = os.path.join(path,get_db_name(path,db_type))
+    tax_db = os.path.join(path,"complete_taxa.db")
+    if not os.path.isdir(map_db):
+        logger.error("\n# [BASTA ERROR] %s is not a database directory. A lineage database can only be built from a mapping database directory." % (map_db))
+        sys.exit()
+    out = os.path.join(path,get_lineage_db_name(db_type))
+    tmp = out + ".tmp"
+    for d in [map_db,tax_db]:
+        if not db_version(d):
+            logger.warning("\n# [BASTA WARNING] %s has no version ID (created by an older BASTA), so the lineage database can not detect when it is recreated. Run 'basta join' again after recreating it." % (d))
+    if os.path.exists(tmp):
+        shutil.rmtree(tmp)
+
+    logger.info("\n# [BASTA STATUS] Joining %s and %s into %s\nThis might take a while, please be patient ...\n" % (map_db,tax_db,out))
+    map_lookup = _init_db(map_db)
+    tax_lookup = _init_db(tax_db)
+    tokens = {}
+    lineages = {}
+    missing = []
+
+    def _items():
+        start_time = timeit.default_timer()
+        for count,(acc,taxon_id) in enumerate(map_lookup.iterator()):
+            token = tokens.get(taxon_id)
+            if token is None:
+                lineage = tax_lookup.get(taxon_id)
+                if lineage is None:
+                    token = taxon_id
+                    missing.append(taxon_id)
+                else:
+                    if lineage not in lineages:
+                        lineages[lineage] = len(lineages)
+                    token = b"#%d" % (lineages[lineage])
+                tokens[taxon_id] = token
+            yield (acc,token)
+            if count and not count % 1000000:
+                logger.info("\n# [BASTA STATUS] %d accessions processed (%.1fsec)" % (count,timeit.default_timer()-start_time))
+        for lineage in lineages:
+            yield (_LINEAGE_PREFIX + b"%d" % (lineages[lineage]),lineage)
+        yield (_META_TAXONOMY,_source_version(tax_db))
+        yield (_META_MAPPING,_source_version(map_db))
+
+    # the lineage database uses the backend of the mapping database
+    backend = db_backend(map_db)
+    DBBackends.BACKENDS[backend].build(tmp,_items())
+    for l in [map_lookup,tax_lookup]:
+        l.close()
+    _write_version(tmp,os.path.basename(map_db),backend)
+    if os.path.exists(out):
+        shutil.rmtree(out)
+    os.rename(tmp,out)
+    logger.info("\n# [BASTA STATUS] %d distinct lineages for %d taxon IDs (%d without lineage)" % (len(lineages),len(tokens),len(missing)))
+
+
+# Version of a database the lineage database is built from. Source
+# databases are never written to, so databases without version file
+# (created by older BASTA versions) are recorded as unknown.
+def _source_version(db):
+    return futils.to_bytes(db_version(db) or "unknown")
+
+
+# Opens the lineage database of the given mapping database if there
+# is one that was built from the current mapping and taxonomy databases.
+# Returns (taxonomy lookup, mapping lookup) or None.
+def open_lineage_db(path,db_file,shared=False,cache_size=None):
+    logger = logging.getLogger()
+    if not db_file.endswith("_mapping.db"):
+        return None
+    out = os.path.join(path,get_lineage_db_name(db_file[:-len("_mapping.db")]))
+    if not os.path.isdir(out):
+        return None
+    lookup = _init_db(out,cache_size,shared)
+    versions = (lookup.get(_META_TAXONOMY),lookup.get(_META_MAPPING))
+    current = (_source_version(os.path.join(path,"complete_taxa.db")),_source_version(os.path.join(path,db_file)))
+    if versions != current:
+        logger.warning("\n# [BASTA WARNING] %s was built from other versions of %s and complete_taxa.db and is not used. Run 'basta join' to rebuild it." % (out,db_file))
+        lookup.close()
+        return None
+    logger.info("\n# [BASTA STATUS] Using lineage database %s" % (out))
+    return (LineageLookup(lookup),lookup)
+
+
+
+# Lookups of the taxonomies of accessions of the given mapping database:
+# its lineage database if there is a current one, else the taxonomy
+# database (or tax_lookup if it is already open) and the mapping database
+def open_lookups(path,db_file,shared=False,cache_size=None,tax_lookup=None):
+    lookups = open_lineage_db(path,db_file,shared,cache_size)
+    if lookups:
+        return lookups
+    logger = logging.getLogger()
+    if tax_lookup is None:
+        logger.info("\n# [BASTA STATUS] Initializing taxonomy database")
+        tax_lookup = _init_db(os.path.join(path,"complete_taxa.db"),cache_size,shared)
+    logger.info("\n# [BASTA STATUS] Initializing mapping database")
+    map_lookup = _init_db(os.path.abspath(os.path.join(path,db_file)),cache_size,shared)
+    return (tax_lookup,map_lookup)
+
+
+
+class LineageLookup():
+    """Taxonomy side of a lineage database: get() returns the lineage of
+    a lineage ID found for an accession, or None for a taxon ID without
+    lineage. Lineages are memoized as hits share few of them."""
+
+    def __init__(self,lookup,memo_size=100000):
+        self.lookup = lookup
+        self.memo_size = memo_size
+        self.memo = {}
+
+    def get(self,token):
+        lineage = self.memo.get(token)
+        if lineage is not None:
+            return lineage
+        if token[:1] != b"#":
+            return None
+        lineage = self.lookup.get(_LINEAGE_PREFIX + token[1:])
+        if len(self.memo) >= self.memo_size:
+            self.memo.clear()
+        self.memo[token] = lineage
+        return lineage
+
+    def close(self):
+        pass
@@ -41,9 +41,11 @@ def wget_file(path,f,outdir):
 def check_md5(f,path):
     with open(os.path.join(path,f)) as f:
         fl = f.readline()
-        l = filter(None,fl.split())
+        l = fl.split()
         filehash = hashlib.md5()
-        filehash.update(open(os.path.join(path,l[1])).read())
+        with open(os.path.join(path,l[1]),"rb") as df:
+            for chunk in iter(lambda: df.read(1024*1024),b""):
+                filehash.update(chunk)
         if str(filehash.hexdigest()) != str(l[0]):
             return 1
         else:
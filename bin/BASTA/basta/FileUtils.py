@@ -1,6 +1,26 @@
+import io
 import os
+import sys
 import gzip
+import zlib
 import timeit
+import re
+import threading
+import subprocess
+from itertools import chain, islice
+from contextlib import contextmanager
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# zstd compressed hit files are read with the Python package
+# zstandard if installed, else through the zstd command
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 #########
 #
@@ -34,60 +54,333 @@ import timeit
 
 
 
-def hit_gen(hit_file,alen,evalue,identity,config,num):
-    """Generator function returning hits grouped by sequence"""
-    with open(hit_file, "r") as f:
+# Hit files and databases are handled as bytes: lines are read in
+# binary mode with a large buffer and accessions go to LevelDB as
+# they are, without decoding and encoding each line.
+BUFFER_SIZE = 1024*1024
+
+# Compressed hit files are recognized by their first bytes, whatever
+# their name. They are decompressed in chunks of at most CHUNK_SIZE
+# bytes by a background thread that reads up to READ_AHEAD chunks ahead.
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+CHUNK_SIZE = 4*1024*1024
+READ_AHEAD = 8
+
+# zstd input is read in pieces of the size of a zstd block, as a frame
+# decompressor returns all output of its input at once
+ZSTD_READ_SIZE = 128*1024
+
+
+def hit_gen(hit_file,alen,evalue,identity,config,num,stats=None,progress=None,names=None):
+    """Generator function returning hits grouped by sequence. If stats
+    (a dict, e.g. the counters of a profile) is given the number of hits
+    read and rejected by each criterion are added to it. If progress (a
+    dict) is given reading starts at byte progress['offset'] and before
+    hits are returned progress['offset'] is set to the byte offset of
+    the next sequence, where a later run can start. names is a dict
+    memo of accessions of subject IDs kept between calls."""
+    parse_hit = _parse_hit if stats is None else _counting_parser(stats)
+    track = progress is not None
+    with _open_hits(hit_file) as f:
+        head = list(islice(f,DETECT_LINES))
+        hit_name = hit_namer(_detect_convention(head,config),stats=stats,memo=names)
         hits = {}
-        hit = ""
-        try:
-            while True:
-                line = f.next()
-                ls = line.split("\t")
+        hit = b""
+        pos = progress.get('offset',0) if track else 0
+        for line in _lines_from(head,f,pos):
+            if track:
+                start = pos
+                pos += len(line)
+            ls = line.split(b"\t")
+
+            # next unless good hit
+            values = parse_hit(ls,alen,evalue,identity,config)
+            if not values:
+                continue
+            nh = ls[config['query_id']]
+
+            # check if new query sequence
+            if hit != nh:
 
-                # next unless good hit
-                if not _check_hit(ls,alen,evalue,identity,config):
+                # check non-empty list of hits
+                if hits:
+                    if track:
+                        progress['offset'] = start
+                    yield hits
+                hit = nh
+                hits = {hit:[Hit(hit_name(ls[config['subject_id']]),*values)]}
+            else:
+                if not hits:
+                    hits[hit] = []
+                if num and len(hits[hit]) == num:
+                    if stats is not None:
+                        stats['filtered_number'] += 1
                     continue
-                nh = ls[config['query_id']]
 
-                # check if new query sequence
-                if hit != nh:
+                hits[hit].append(Hit(hit_name(ls[config['subject_id']]),*values))  
+        if hits:
+            if track:
+                progress['offset'] = pos
+            yield hits
+
+
+# Lines of an opened hit file from the given byte offset (the start of
+# a line) on. The lines read for detection are at the start of the file.
+# Plain files are seeked, compressed ones read up to the offset.
+def _lines_from(head,f,offset):
+    lines = chain(head,f)
+    if not offset:
+        return lines
+    if hasattr(f,"seek"):
+        f.seek(offset)
+        return f
+    pos = 0
+    for line in lines:
+        pos += len(line)
+        if pos >= offset:
+            break
+    return lines
 
-                    # check non-empty list of hits
-                    if hits:
-                        yield hits
-                    hit = nh
-                    hits = {hit:[_hit_hash(ls,config)]}
+
+
+
+# Open hit file by name or use an already opened binary file
+# object (e.g. hits streamed in through a socket) as it is
+@contextmanager
+def _open_hits(hit_file):
+    if hasattr(hit_file,"read"):
+        yield hit_file
+    else:
+        with open_hit_file(hit_file) as f:
+            yield f
+
+
+# Open (gzip compressed) file in binary mode with a large buffer
+def open_binary(path,mode="rb"):
+    if path.endswith(".gz"):
+        return gzip.open(path,mode)
+    return open(path,mode,BUFFER_SIZE)
+
+
+# Open a plain, gzip or zstd compressed hit file for reading lines.
+# Compressed files are decompressed while the lines are parsed, by a
+# background thread or, for zstd without zstandard, a zstd process.
+def open_hit_file(path):
+    with open(path,"rb") as f:
+        magic = f.read(len(ZSTD_MAGIC))
+    if magic.startswith(GZIP_MAGIC):
+        return BackgroundReader(_gzip_chunks(path))
+    if magic == ZSTD_MAGIC:
+        if zstandard is not None:
+            return BackgroundReader(_zstd_chunks(path))
+        return ProcessReader(["zstd","-dcq",path])
+    return open(path,"rb",BUFFER_SIZE)
+
+
+# Decompressed chunks of all members of a gzip file. A file that ends
+# inside a member is truncated and raises an IOError after its data.
+def _gzip_chunks(path):
+    with open(path,"rb") as f:
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        for data in iter(lambda: f.read(BUFFER_SIZE),b""):
+            while data:
+                chunk = d.decompress(data,CHUNK_SIZE)
+                if chunk:
+                    yield chunk
+                # input after the end of a member starts the next one
+                if d.unused_data:
+                    data = d.unused_data
+                    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
                 else:
-                    if not hits:
-                        hits[hit] = []
-                    if num and len(hits[hit]) == num:
-                        continue
-
-                    hits[hit].append(_hit_hash(ls,config))  
-        except StopIteration:
-            if hits:
-                yield hits
-            else:
-               return
+                    data = d.unconsumed_tail
+        eof = _zlib_eof(d)
+        chunk = d.flush()
+        if chunk:
+            yield chunk
+        if not eof:
+            raise IOError("%s is truncated: unexpected end of gzip data" % (path))
+
+
+# Python 2 has no decompressobj.eof: after the end of the
+# stream further input is returned as unused data
+def _zlib_eof(d):
+    if hasattr(d,"eof"):
+        return d.eof
+    d = d.copy()
+    try:
+        d.decompress(b"\0")
+    except zlib.error:
+        return False
+    return d.unused_data == b"\0"
+
+
+# Decompressed chunks of all frames of a zstd file. Decompressed frame
+# by frame as the stream_reader of zstandard silently stops at the end
+# of a truncated file.
+def _zstd_chunks(path):
+    dctx = zstandard.ZstdDecompressor()
+    with open(path,"rb") as f:
+        d = dctx.decompressobj()
+        pending = False
+        for data in iter(lambda: f.read(ZSTD_READ_SIZE),b""):
+            while data:
+                if d.eof:
+                    d = dctx.decompressobj()
+                chunk = d.decompress(data)
+                pending = not d.eof
+                if chunk:
+                    yield chunk
+                data = d.unused_data if d.eof else b""
+        if pending:
+            raise IOError("%s is truncated: unexpected end of zstd data" % (path))
+
+
+
+class BackgroundReader(object):
+    """Binary lines of the chunks of a generator run by a background
+    thread. Used like a file opened with open_binary."""
+
+    def __init__(self,chunks):
+        self.queue = queue.Queue(READ_AHEAD)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._produce,args=(chunks,))
+        self.thread.daemon = True
+        self.thread.start()
+        self.lines = chain.from_iterable(self._buffers())
+
+    def _produce(self,chunks):
+        try:
+            for chunk in chunks:
+                if not self._put(chunk):
+                    return
+            self._put(None)
+        except Exception as e:
+            self._put(e)
+        finally:
+            chunks.close()
+
+    # False if the reader was closed before the item could be queued
+    def _put(self,item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item,timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    # Complete lines of each chunk as a file object, so that the lines
+    # are split by io.BytesIO and not one by one in Python
+    def _buffers(self):
+        rest = b""
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                break
+            if isinstance(chunk,Exception):
+                raise chunk
+            data = rest + chunk
+            end = data.rfind(b"\n") + 1
+            rest = data[end:]
+            yield io.BytesIO(data[:end])
+        if rest:
+            yield io.BytesIO(rest)
+
+    def __iter__(self):
+        return self.lines
+
+    def __next__(self):
+        return next(self.lines)
+
+    next = __next__
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+
+
+class ProcessReader(object):
+    """Binary lines of the output of a decompression command"""
+
+    def __init__(self,cmd):
+        self.cmd = cmd
+        try:
+            self.proc = subprocess.Popen(cmd,stdout=subprocess.PIPE,bufsize=BUFFER_SIZE)
+        except OSError:
+            raise IOError("Reading %s requires the Python package zstandard or the %s command" % (cmd[-1],cmd[0]))
 
+    def __iter__(self):
+        return iter(self.proc.stdout)
 
+    # Exit code of the command
+    def close(self):
+        self.proc.stdout.close()
+        return self.proc.wait()
 
+    def __enter__(self):
+        return self
 
-def _check_hit(ls,alen,evalue,ident,config):
+    # The exit code is only checked if all lines were read: a command
+    # stopped early fails on its closed output
+    def __exit__(self,exc_type,exc,tb):
+        code = self.close()
+        if exc_type is None and code:
+            raise IOError("%s failed with exit code %d" % (" ".join(self.cmd),code))
+
+
+def to_bytes(s):
+    return s if isinstance(s,bytes) else s.encode("utf-8")
+
+
+def to_str(b):
+    return b if isinstance(b,str) else b.decode("utf-8","replace")
+
+
+
+# Returns (identity, evalue, alignment length) of a good hit, else None
+def _parse_hit(ls,alen,evalue,ident,config):
     try:
-        if float(ls[config['pident']]) < ident:
-            return 0
-        if float(ls[config['evalue']]) > evalue:
-            return 0
-        if int(ls[config['align_length']]) < alen:
-            return 0
-        return 1
+        i = float(ls[config['pident']])
+        if i < ident:
+            return None
+        e = float(ls[config['evalue']])
+        if e > evalue:
+            return None
+        a = int(ls[config['align_length']])
+        if a < alen:
+            return None
+        return (i,e,a)
     except IndexError:
         print("\n#### [BASTA ERROR] ####\n#\n# INDEX ERROR WHILE CHECKING e-value, alingment length OR percent  identity!!!.\n# Are you sure that your input file has the correct format?\n# (For details check https://github.com/timkahlke/BASTA/wiki/3.-BASTA-Usage#input-file-format)\n#\n#####\n\n")
         sys.exit()
 
 
 
+# _parse_hit counting read hits and the criterion a hit failed
+def _counting_parser(stats):
+    def parse_hit(ls,alen,evalue,ident,config):
+        stats['hits_read'] += 1
+        values = _parse_hit(ls,alen,evalue,ident,config)
+        if not values:
+            if float(ls[config['pident']]) < ident:
+                stats['filtered_identity'] += 1
+            elif float(ls[config['evalue']]) > evalue:
+                stats['filtered_evalue'] += 1
+            else:
+                stats['filtered_alen'] += 1
+        return values
+    return parse_hit
+
+
+
 def _get_hit_name(hs):
     # Figure out if the hit is of format 
     # >bla|accession.version|additional-string
@@ -97,18 +390,152 @@ def _get_hit_name(hs):
     # >gi|gi_number|ref|accession
 
     # DIRTY! Create a better name guessing!!!!
-    ps=hs.split("|")
+    ps=hs.split(b"|")
     if len(ps)>=3:
-        if ps[0] == 'gi':
-            return  [x for x in ps[3].split(".") if x][0]
+        if ps[0] == b'gi':
+            return  [x for x in ps[3].split(b".") if x][0]
         else:
-            return  [x for x in ps[1].split(".") if x][0]
+            return  [x for x in ps[1].split(b".") if x][0]
     else:
-        return  [x for x in hs.replace(">","").split(".") if x][0]
+        return  [x for x in hs.replace(b">",b"").split(b".") if x][0]
+
 
 
+# Number of lines used to detect the subject ID convention of a hit file
+DETECT_LINES = 100
+
+# Fast paths for the subject ID conventions understood by _get_hit_name.
+# Each returns the accession or None if the ID does not have the expected
+# shape, in which case _get_hit_name is used.
+_GI_NAME = re.compile(br"gi\|[^|]*\|[^|]*\|([^.|]+)").match
+_DB_NAME = re.compile(br"(?!gi\|)[^|]*\|([^.|]+)[^|]*\|").match
+
+
+def _gi_name(hs):
+    m = _GI_NAME(hs)
+    return m.group(1) if m else None
+
+
+def _db_name(hs):
+    m = _DB_NAME(hs)
+    return m.group(1) if m else None
+
+
+# Plain accessions have no fast path: _get_hit_name is already
+# cheaper for them than any check of their shape (bench_hit_names.py)
+CONVENTIONS = {'gi':_gi_name,'db':_db_name}
+
+
+def _get_convention(hs):
+    ps = hs.split(b"|",3)
+    if len(ps) >= 3:
+        return 'gi' if ps[0] == b'gi' else 'db'
+    return 'plain'
+
+
+# Most common convention of the subject IDs in the given lines
+def _detect_convention(lines,config):
+    counts = {}
+    for line in lines:
+        try:
+            c = _get_convention(line.split(b"\t")[config['subject_id']])
+        except IndexError:
+            continue
+        counts[c] = counts.get(c,0) + 1
+    if not counts:
+        return None
+    return max(counts,key=counts.get)
 
-def _hit_hash(ls,config):
-    return {'id':_get_hit_name(ls[config['subject_id']]),'identity':ls[config['pident']],'evalue':ls[config['evalue']],'alen':ls[config['align_length']]}
 
 
+# Function returning the accession of a subject ID. Uses the fast path
+# of the given convention and a bounded memo (memo_size=0 disables it),
+# as subject IDs repeat a lot across queries. Memo hits and misses are
+# counted in stats if given. The conventions only take a faster path to
+# the same accession, so a memo can be shared by several hit files.
+def hit_namer(convention=None,memo_size=500000,stats=None,memo=None):
+    fast = CONVENTIONS.get(convention)
+
+    def fast_hit_name(hs):
+        return fast(hs) or _get_hit_name(hs)
+
+    hit_name = fast_hit_name if fast else _get_hit_name
+
+    if not memo_size:
+        return hit_name
+    if memo is None:
+        memo = {}
+
+    def memo_hit_name(hs):
+        name = memo.get(hs)
+        if name is None:
+            name = hit_name(hs)
+            # Cheap bound: start over once the memo is full
+            if len(memo) >= memo_size:
+                memo.clear()
+            memo[hs] = name
+        return name
+
+    if stats is None:
+        return memo_hit_name
+
+    def counting_hit_name(hs):
+        if hs in memo:
+            stats['name_memo_hits'] += 1
+        else:
+            stats['name_memo_misses'] += 1
+        return memo_hit_name(hs)
+    return counting_hit_name
+
+
+
+class Hit(object):
+    """Accepted hit of a query sequence. Fields can also be
+    read like the keys of a dict, e.g. hit['id']"""
+
+    __slots__ = ('id','identity','evalue','alen')
+
+    def __init__(self,id,identity,evalue,alen):
+        self.id = id
+        self.identity = identity
+        self.evalue = evalue
+        self.alen = alen
+
+    def __getitem__(self,key):
+        try:
+            return getattr(self,key)
+        except AttributeError:
+            raise KeyError(key)
+
+
+
+class InfoWriter():
+    """Buffered writer for the detailed taxonomy (-v) of each query"""
+
+    def __init__(self,info_file,fmt="text",buffer_size=BUFFER_SIZE):
+        self.fh = open(info_file,"ab",buffer_size)
+        self.fmt = fmt
+
+    # text: one block per query with one "count<TAB>taxon" line per node
+    # tsv: one "query<TAB>count<TAB>taxon" line per node
+    def write(self,seq,tree):
+        lines = []
+        if self.fmt == "tsv":
+            prefix = seq + b"\t"
+        else:
+            prefix = b""
+            lines.append(b"###%s\n" % (seq))
+        self._branch(lines,prefix,b"",tree.tree)
+        if self.fmt != "tsv":
+            lines.append(b"\n\n")
+        self.fh.write(b"".join(lines))
+
+    def _branch(self,lines,prefix,ts,t):
+        for b in t:
+            if b == "count":
+                lines.append(b"%s%d\t%s\n" % (prefix,t["count"],ts))
+            else:
+                self._branch(lines,prefix,ts + b + b";",t[b])
+
+    def close(self):
+        self.fh.close()
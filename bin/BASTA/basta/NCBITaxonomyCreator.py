@@ -42,24 +42,24 @@ class Creator():
 
     # Start writing output zip file
     def _write(self,out):
-        oh = gzip.open(out + ".gz","w")
-        self._walk(oh,self.tree["1"],"","1")
+        oh = gzip.open(out + ".gz","wb")
+        self._walk(oh,self.tree[b"1"],b"",b"1")
         oh.close()
 
 
     # Ranks of interest (e.g. 7 taxon levels)
     def _ranks(self):
-        ranks=['superkingdom','phylum','class','order','family','genus','species']
+        ranks=[b'superkingdom',b'phylum',b'class',b'order',b'family',b'genus',b'species']
         return ranks
 
 
     # read names file
     def _read_names(self,nf):
         names = {}
-        with open(nf,"r") as f:
+        with open(nf,"rb") as f:
             for line in f:
-                if "scientific name" in line:
-                    ls = line.replace(";","_").replace("\n","").replace("\t","").replace(" ","_").split("|")
+                if b"scientific name" in line:
+                    ls = line.replace(b";",b"_").replace(b"\n",b"").replace(b"\t",b"").replace(b" ",b"_").split(b"|")
                     names[ls[0]]=ls[1]
         return names
 
@@ -70,33 +70,33 @@ class Creator():
     def _walk(self,oh,tree,last,taxon_id):
         taxon_string = last
         # Create complete taxon string of current level for output file
-        current = ""
+        current = b""
         if tree['rank'] in self.ranks:
             current = self._fill_taxon_pre_rank(tree['rank'],taxon_string)
-            current+=tree['name'] + ";"
+            current+=tree['name'] + b";"
             current = self._fill_taxon_post_rank(tree['rank'],current)
-            if len(current.split(";"))-1 != len(self.ranks):
+            if len(current.split(b";"))-1 != len(self.ranks):
                 self.logger.error("\n# [BASTA ERROR] Wrong number of taxa in string %s" % (current))
                 sys.exit()
         else:
             current = taxon_string
-            if len(taxon_string.split(";")) < len(self.ranks):
-                current += tree['name'] + ";"
+            if len(taxon_string.split(b";")) < len(self.ranks):
+                current += tree['name'] + b";"
 
             # If no (known) rank assign last known rank to taxon
-            current = self._fill_taxon_post_rank(self.ranks[len(current.split(";"))-2],current)
-            if len(current.split(";"))-1 != len(self.ranks):
+            current = self._fill_taxon_post_rank(self.ranks[len(current.split(b";"))-2],current)
+            if len(current.split(b";"))-1 != len(self.ranks):
                 self.logger.error("\n# [BASTA ERROR] Wrong number of taxa in string %s" % (current))
                 sys.exit()
 
-        oh.write("%s\t%s\n" % (taxon_id,current))
+        oh.write(b"%s\t%s\n" % (taxon_id,current))
 
         # Walk through child nodes of this level
         for k in tree:
             if k == 'name' or k =='rank':
                 continue
             if tree['rank'] in self.ranks:
-                taxon_string = self._fill_taxon_pre_rank(tree['rank'],last) + tree['name'] + ";"
+                taxon_string = self._fill_taxon_pre_rank(tree['rank'],last) + tree['name'] + b";"
 
             self._walk(oh,tree[k],taxon_string,k)
 
@@ -104,15 +104,15 @@ class Creator():
     # Fill taxon string with "unknown;" until current
     # taxon level is reached
     def _fill_taxon_pre_rank(self,rank,string):
-        x = len(string.split(";"))-1 if string else 0
+        x = len(string.split(b";"))-1 if string else 0
         y = self.ranks.index(rank)
 
         if x<y:
-            for z in xrange(x,y):
-                string+="unknown;"
+            for z in range(x,y):
+                string+=b"unknown;"
         elif x>y:
             # needed for screw up in NCBI for multiple same level taxa assignments
-            string = ";".join(string.split(";")[:y]) + ";" 
+            string = b";".join(string.split(b";")[:y]) + b";" 
         return string
 
 
@@ -120,8 +120,8 @@ class Creator():
     # taxon level is reached
     def _fill_taxon_post_rank(self,rank,string):
         y = self.ranks.index(rank)
-        for z in xrange(y+1,len(self.ranks)):
-            string+="unknown;"    
+        for z in range(y+1,len(self.ranks)):
+            string+=b"unknown;"    
         return string
 
 
@@ -131,9 +131,9 @@ class Creator():
     def _read_corrections(self):
         corrections = {}
         try:
-            with open(os.path.abspath(os.path.join(os.path.dirname(__file__),"../taxonomy/ncbi_taxonomy.correction")),"r") as f:
+            with open(os.path.abspath(os.path.join(os.path.dirname(__file__),"../taxonomy/ncbi_taxonomy.correction")),"rb") as f:
                 for line in f:
-                    ls = line.replace("\n","").split()
+                    ls = line.replace(b"\n",b"").split()
                     corrections[ls[0]] = ls[1]
         except IOError:
             pass
@@ -144,9 +144,9 @@ class Creator():
     def _build(self,nodes):
         parents = {}
         corrections = self._read_corrections()
-        with open(nodes,"r") as nf:
+        with open(nodes,"rb") as nf:
             for line in nf:
-                ls = line.replace(" ","").replace("\n","").replace("\t","").split("|")
+                ls = line.replace(b" ",b"").replace(b"\n",b"").replace(b"\t",b"").split(b"|")
 
                 if ls[0] in corrections:
                     if ls[2] != corrections[ls[0]]:
@@ -155,7 +155,7 @@ class Creator():
     
                 # only root has same parent and child
                 if ls[0] == ls[1]:
-                    parents[ls[0]] = {'rank':'norank','name':'root'}
+                    parents[ls[0]] = {'rank':b'norank','name':b'root'}
                     continue
 
                 # add child data
@@ -170,5 +170,5 @@ class Creator():
                     parents[ls[1]]={}
                 parents[ls[1]][ls[0]] = parents[ls[0]]
 
-        return {"1":parents["1"]}
+        return {b"1":parents[b"1"]}
 
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import mmap
+import heapq
+import bisect
+import struct
+import shutil
+import logging
+import tempfile
+import timeit
+
+from basta import FileUtils as futils
+
+
+############
+#
+#   Read-only accession -> taxon ID index: a single file of sorted,
+#   prefix compressed keys with fixed width taxon IDs, searched
+#   through mmap. An alternative to the LevelDB mapping databases
+#   for references that never change.
+#
+####
+#   COPYRIGHT DISCLAIMER:
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   Author: BASTA contributors
+#   Date:   October 2026
+#
+
+
+# File layout (little endian):
+#   header  magic, keys per block, number of keys, number of blocks,
+#           offset of the block index
+#   blocks  first entry:  key length (1 byte), key, taxon ID (4 bytes)
+#           other entries: length of the prefix shared with the previous
+#           key (1 byte), length of the rest (1 byte), rest, taxon ID
+#   index   file offset of each block (8 bytes)
+MAGIC = b"BASTAIX1"
+SUFFIX = ".idx"
+
+_HEADER = struct.Struct("<8sIQQQ")
+_BYTE = struct.Struct("<B")
+_PAIR = struct.Struct("<BB")
+_TAXON = struct.Struct("<I")
+_OFFSET = struct.Struct("<Q")
+
+
+class SortedIndex():
+    """Read-only mapping with the get() of a plyvel database. Keys are
+    found by binary search over the first key of each block followed by
+    a scan of at most one block."""
+
+    def __init__(self,path,sparse=64):
+        self.path = path
+        self.fh = open(path,"rb")
+        self.mm = mmap.mmap(self.fh.fileno(),0,access=mmap.ACCESS_READ)
+        (magic,self.block_size,self.n,self.blocks,self.index) = _HEADER.unpack_from(self.mm,0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("%s is not a BASTA index" % (path))
+        # first key of every sparse-th block, searched in memory before
+        # the binary search over the blocks in between
+        self.sparse = sparse
+        self.top = [self._first_key(i) for i in range(0,self.blocks,sparse)]
+
+    def _block_offset(self,i):
+        return _OFFSET.unpack_from(self.mm,self.index + 8 * i)[0]
+
+    def _first_key(self,i):
+        off = self._block_offset(i)
+        klen = _BYTE.unpack_from(self.mm,off)[0]
+        return self.mm[off+1:off+1+klen]
+
+    # Last block whose first key is not larger than key
+    def _find_block(self,key):
+        lo = max(0,bisect.bisect_right(self.top,key) - 1) * self.sparse
+        hi = min(lo + self.sparse,self.blocks) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self._first_key(mid) <= key:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def _entries(self,i):
+        mm = self.mm
+        off = self._block_offset(i)
+        klen = _BYTE.unpack_from(mm,off)[0]
+        off += 1
+        key = mm[off:off+klen]
+        off += klen
+        yield (key,_TAXON.unpack_from(mm,off)[0])
+        off += 4
+        for j in range(min(self.block_size,self.n - i * self.block_size) - 1):
+            (shared,rest) = _PAIR.unpack_from(mm,off)
+            off += 2
+            key = key[:shared] + mm[off:off+rest]
+            off += rest
+            yield (key,_TAXON.unpack_from(mm,off)[0])
+            off += 4
+
+    # Same scan as _entries(), inlined as it runs for every lookup
+    def get(self,key,default=None):
+        if not self.blocks:
+            return default
+        mm = self.mm
+        i = self._find_block(key)
+        off = self._block_offset(i)
+        klen = _BYTE.unpack_from(mm,off)[0]
+        k = mm[off+1:off+1+klen]
+        off += 1 + klen
+        for j in range(min(self.block_size,self.n - i * self.block_size)):
+            if j:
+                (shared,rest) = _PAIR.unpack_from(mm,off)
+                k = k[:shared] + mm[off+2:off+2+rest]
+                off += 2 + rest
+            if k == key:
+                return b"%d" % (_TAXON.unpack_from(mm,off)[0])
+            if k > key:
+                break
+            off += 4
+        return default
+
+    def multi_get(self,keys):
+        return [self.get(k) for k in keys]
+
+    # (key,taxon ID) pairs or keys in key order
+    def iterator(self,start=None,stop=None,include_value=True):
+        first = self._find_block(start) if start is not None and self.blocks else 0
+        for i in range(first,self.blocks):
+            for (k,taxon) in self._entries(i):
+                if start is not None and k < start:
+                    continue
+                if stop is not None and k >= stop:
+                    return
+                yield (k,b"%d" % (taxon)) if include_value else k
+
+    def __iter__(self):
+        return self.iterator()
+
+    def __len__(self):
+        return self.n
+
+    def close(self):
+        self.mm.close()
+        self.fh.close()
+
+
+
+# Write the (key,taxon ID) pairs of a sorted iterator
+def write(path,items,block_size=32):
+    offsets = []
+    n = 0
+    with open(path,"wb") as f:
+        f.write(_HEADER.pack(MAGIC,block_size,0,0,0))
+        prev = b""
+        for (key,taxon) in items:
+            if len(key) > 255:
+                raise ValueError("Key %s is longer than 255 bytes" % (futils.to_str(key)))
+            if not n % block_size:
+                offsets.append(f.tell())
+                f.write(_BYTE.pack(len(key)) + key)
+            else:
+                shared = _shared_prefix(prev,key)
+                f.write(_PAIR.pack(shared,len(key) - shared) + key[shared:])
+            f.write(_TAXON.pack(taxon))
+            prev = key
+            n += 1
+        index = f.tell()
+        for o in offsets:
+            f.write(_OFFSET.pack(o))
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC,block_size,n,len(offsets),index))
+    return n
+
+
+def _shared_prefix(a,b):
+    i = 0
+    m = min(len(a),len(b),255)
+    while i < m and a[i:i+1] == b[i:i+1]:
+        i += 1
+    return i
+
+
+
+# Build an index from columns i1 (key) and i2 (taxon ID) of a tab
+# separated file. The first line is skipped like in create_db. Lines
+# are sorted in runs of chunk_size lines that are merged at the end.
+# Of keys occurring several times the last one is kept.
+def create_index(path,f,of,i1,i2,chunk_size=2000000):
+    logger = logging.getLogger()
+    ip = f if os.path.exists(f) else os.path.join(path,f)
+    op = os.path.join(path,of)
+    i1 = int(i1)
+    i2 = int(i2)
+    logger.info("\n# [BASTA STATUS] Reading mapping file\nThis might take a while, please be patient ...\n")
+
+    tmp = tempfile.mkdtemp(prefix=".basta_index_",dir=path)
+    runs = []
+    try:
+        start_time = timeit.default_timer()
+        chunk = {}
+        try:
+            with futils.open_binary(ip) as fh:
+                for count,line in enumerate(fh):
+                    if not count:
+                        continue
+                    ls = line.split()
+                    try:
+                        chunk[ls[i1]] = int(ls[i2])
+                    except ValueError:
+                        logger.error("\n# [BASTA ERROR] Taxon ID %s in line %d of %s is not a number. Indices can only store numeric taxon IDs." % (futils.to_str(ls[i2]),count+1,ip))
+                        sys.exit()
+                    if len(chunk) >= chunk_size:
+                        runs.append(_write_run(tmp,len(runs),chunk))
+                        chunk = {}
+                        logger.info("\n# [BASTA STATUS] %d lines sorted (%.1fsec)" % (count,timeit.default_timer()-start_time))
+        except IOError:
+            logger.error("\n# [BASTA ERROR] No file %s: did you forget to download mapping file (parameter -d True)?" % (ip))
+            sys.exit()
+
+        if runs:
+            if chunk:
+                runs.append(_write_run(tmp,len(runs),chunk))
+            items = _merge_runs(runs)
+        else:
+            items = sorted(chunk.items())
+        n = write(op + ".tmp",items)
+        for r in runs:
+            r.close()
+        os.rename(op + ".tmp",op)
+    finally:
+        shutil.rmtree(tmp,True)
+    logger.info("\n# [BASTA STATUS] Index %s written: %d keys, %.1f MB (%.1fsec)" % (op,n,os.path.getsize(op)/1e6,timeit.default_timer()-start_time))
+
+
+def _write_run(tmp,i,chunk):
+    fh = open(os.path.join(tmp,"run_%d" % (i)),"w+b")
+    for key in sorted(chunk):
+        fh.write(b"%s\t%d\n" % (key,chunk[key]))
+    fh.seek(0)
+    return fh
+
+
+def _read_run(fh,i):
+    for line in fh:
+        (key,taxon) = line.rstrip(b"\n").split(b"\t")
+        yield (key,i,int(taxon))
+
+
+# Keys of later runs come from later lines and replace earlier ones
+def _merge_runs(runs):
+    prev = None
+    for (key,i,taxon) in heapq.merge(*[_read_run(fh,i) for (i,fh) in enumerate(runs)]):
+        if prev is not None and prev[0] != key:
+            yield prev
+        prev = (key,taxon)
+    if prev is not None:
+        yield prev
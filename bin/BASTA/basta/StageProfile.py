@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+import os
+import time
+import json
+import timeit
+
+
+############
+#
+#   Wall and CPU time of the assignment stages and run counters,
+#   written as a JSON file next to the BASTA output (--profile)
+#
+####
+#   COPYRIGHT DISCLAIMER:
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   Author: BASTA contributors
+#   Date:   October 2026
+#
+
+
+STAGES = ['parse','mapping_lookup','taxonomy_lookup','lca','output']
+
+# CPU time of the calling thread where available (Python >= 3.7),
+# else of the whole process
+_wall = timeit.default_timer
+cpu_time = getattr(time,"thread_time",None) or getattr(time,"process_time",None) or time.clock
+
+# Suffix of the profile file written next to the output file
+SUFFIX = ".profile.json"
+
+
+class Stage():
+
+    def __init__(self):
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.calls = 0
+
+    def add(self,wall,cpu,calls=1):
+        self.wall += wall
+        self.cpu += cpu
+        self.calls += calls
+
+    def as_dict(self):
+        return {'wall_sec':self.wall,'cpu_sec':self.cpu,'calls':self.calls}
+
+
+
+class Profile():
+    """Stage timings and counters of one assignment run. A profile is
+    only used by one thread, profiles of several threads are merged
+    with update()."""
+
+    def __init__(self,command=""):
+        self.command = command
+        self.stages = dict((s,Stage()) for s in STAGES)
+        self.counters = dict((c,0) for c in ['hits_read','filtered_identity','filtered_evalue','filtered_alen','filtered_number','name_memo_hits','name_memo_misses','queries','queries_assigned','files','files_assigned'])
+        self.pipeline = None
+        self.start_wall = _wall()
+        self.start_cpu = _processcpu_time()
+
+
+    # Wrap function so that each call is added to the given stage
+    def timed(self,name,func):
+        stage = self.stages[name]
+
+        def timed_func(*args):
+            w = _wall()
+            c = cpu_time()
+            try:
+                return func(*args)
+            finally:
+                stage.add(_wall()-w,cpu_time()-c)
+        return timed_func
+
+
+    # Wrap iterator so that the time spent producing each item
+    # (e.g. reading and parsing hits) is added to the given stage
+    def timed_iter(self,name,it):
+        stage = self.stages[name]
+        it = iter(it)
+        while True:
+            w = _wall()
+            c = cpu_time()
+            try:
+                item = next(it)
+            except StopIteration:
+                stage.add(_wall()-w,cpu_time()-c)
+                return
+            stage.add(_wall()-w,cpu_time()-c)
+            yield item
+
+
+    # Database handle whose get() calls are added to the given stage
+    def timed_db(self,name,lookup):
+        return _TimedDB(lookup,self.timed(name,lookup.get))
+
+
+    # unit is 'queries' or, if one LCA is estimated per file, 'files'
+    def count_query(self,lca,unit="queries"):
+        self.counters[unit] += 1
+        if lca != b"Unknown":
+            self.counters[unit + '_assigned'] += 1
+
+
+    # Stages run concurrently by the pipeline report their busy time.
+    # Database lookups are still timed through timed_db().
+    def add_pipeline(self,counters):
+        self.pipeline = counters
+        for s in ['parse','lca','output']:
+            self.stages[s].add(counters[s]['busy_sec'],counters[s]['cpu_sec'],counters[s]['batches'])
+
+
+    def update(self,other):
+        for s in other.stages:
+            st = other.stages[s]
+            self.stages[s].add(st.wall,st.cpu,st.calls)
+        for c in other.counters:
+            self.counters[c] = self.counters.get(c,0) + other.counters[c]
+
+
+    def as_dict(self,missing=None):
+        c = self.counters
+        filtered = c['filtered_identity'] + c['filtered_evalue'] + c['filtered_alen'] + c['filtered_number']
+        names = c['name_memo_hits'] + c['name_memo_misses']
+        lcas = c.get('lca_memo_hits',0) + c.get('lca_memo_misses',0)
+        d = {
+            'command':self.command,
+            'wall_sec':_wall()-self.start_wall,
+            'cpu_sec':_processcpu_time()-self.start_cpu,
+            'stages':dict((s,self.stages[s].as_dict()) for s in self.stages),
+            'counters':dict(c,hits_accepted=c['hits_read']-filtered),
+            'rates':{
+                'name_memo_hit_rate':float(c['name_memo_hits'])/names if names else 0.0,
+                'lca_memo_hit_rate':float(c.get('lca_memo_hits',0))/lcas if lcas else 0.0,
+                'queries_assigned_rate':float(c['queries_assigned'])/c['queries'] if c['queries'] else 0.0,
+                'files_assigned_rate':float(c['files_assigned'])/c['files'] if c['files'] else 0.0,
+            },
+        }
+        if missing:
+            d['counters']['hits_missing_mapping'] = missing.mapping_hits
+            d['counters']['hits_missing_taxon'] = missing.taxon_hits
+        if self.pipeline:
+            d['pipeline'] = self.pipeline
+        return d
+
+
+    def write(self,out,missing=None):
+        with open(out,"w") as f:
+            json.dump(self.as_dict(missing),f,indent=2,sort_keys=True)
+            f.write("\n")
+
+
+
+# User and system time of this process and its finished children
+def _processcpu_time():
+    t = os.times()
+    return t[0] + t[1] + t[2] + t[3]
+
+
+
+class _TimedDB():
+
+    def __init__(self,lookup,get):
+        self.lookup = lookup
+        self.get = get
+
+    def __getattr__(self,name):
+        return getattr(self.lookup,name)
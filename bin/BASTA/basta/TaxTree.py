@@ -1,3 +1,7 @@
+import sys
+import logging
+from collections import OrderedDict
+
 #########
 #
 #   TaxTree.py - tree structure of given taxon names plus
@@ -25,25 +29,146 @@
 #   Date:   April 2017
 #
 
+# Taxon strings are bytes as read from the taxonomy database
+
+# LCA of the given taxon strings. If lazy is set the minimum number
+# of supporting strings is capped at the number of strings given.
+def get_lca(taxa,minimum,lazy,method):
+    return tree_lca(build_tree(taxa),len(taxa),minimum,lazy,method)
+
+
+def build_tree(taxa):
+    tree = TTree()
+    for t in taxa:
+        tree.add_taxon(tree.tree,t)
+    return tree
+
+
+def tree_lca(tree,total,minimum,lazy,method):
+    if lazy:
+        minimum = min(minimum,total)
+    return tree.lca(minimum,total,method)
+
+
+
+class LCAMemo():
+    """Bounded memo of LCAs. The key is the sorted list of taxon strings
+    (the LCA does not depend on their order) plus the LCA settings, so
+    queries with the same hits skip building the tree. A memo dict can
+    be shared by several LCAMemos (e.g. jobs of a server), each counting
+    its own hits and misses."""
+
+    def __init__(self,size=20000,memo=None):
+        self.size = size
+        self.memo = {} if memo is None else memo
+        self.hits = 0
+        self.misses = 0
+
+    def get_lca(self,taxa,minimum,lazy,method):
+        key = (method,minimum,lazy,tuple(sorted(taxa)))
+        lca = self.memo.get(key)
+        if lca is not None:
+            self.hits += 1
+            return lca
+        self.misses += 1
+        lca = get_lca(taxa,minimum,lazy,method)
+        # Cheap bound: start over once the memo is full
+        if len(self.memo) >= self.size:
+            self.memo.clear()
+        self.memo[key] = lca
+        return lca
+
+    def rate(self):
+        total = self.hits + self.misses
+        return float(self.hits)/total if total else 0.0
+
+
+
+class LCAAccumulator():
+    """Takes the taxon strings of one query one at a time and tells
+    when the LCA can no longer change. With method 'all' the LCA is
+    Unknown as soon as two strings differ in their first rank, whatever
+    minimum and lazy are and whatever strings follow. Other methods
+    depend on the total number of strings and are never decided early."""
+
+    def __init__(self,method):
+        self.method = method
+        self.first = None
+        self.decided = False
+
+    # Returns True once the LCA is decided
+    def add(self,taxon):
+        if self.method != 'all' or self.decided:
+            return self.decided
+        top = taxon.split(b";",1)[0]
+        # empty first ranks are not added to the tree
+        if not top:
+            return False
+        if self.first is None:
+            self.first = top
+        elif top != self.first:
+            self.decided = True
+        return self.decided
+
+
+
+class LineageCounts():
+    """Number of occurrences of each distinct taxon string. Takes the
+    strings one at a time like a list (append) and gives the same tree
+    and LCA as the list of all strings, but memory only grows with the
+    number of distinct strings."""
+
+    def __init__(self):
+        self.counts = OrderedDict()
+        self.total = 0
+        self.first = None
+
+    def append(self,taxon,count=1):
+        if self.first is None:
+            self.first = taxon
+        self.counts[taxon] = self.counts.get(taxon,0) + count
+        self.total += count
+
+    def __len__(self):
+        return self.total
+
+    # List holding the first string only, all that is needed of the
+    # strings for the best hit column of the output
+    def best(self):
+        return [self.first] if self.first is not None else []
+
+    # Strings are added in the order they were first seen, so the
+    # nodes of the tree are in the same order as for the full list
+    def tree(self):
+        tree = TTree()
+        for (t,c) in self.counts.items():
+            tree.add_taxon(tree.tree,t,c)
+        return tree
+
+    def lca(self,minimum,lazy,method):
+        return tree_lca(self.tree(),self.total,minimum,lazy,method)
+
+
+
 class TTree(object):
     def __init__(self):
         self.tree = {}
-        self.taxon=""
+        self.taxon=b""
 
-    # Add new taxon to the tree
-    def add_taxon(self,tree,string):
+    # Add new taxon to the tree, count times
+    def add_taxon(self,tree,string,count=1):
         ts = self._get_known_strings(string)
-        self._add(tree,ts)
+        self._add(tree,ts,count)
 
     # Walk through tree and add each level of new taxon
-    def _add(self,tree,taxon):
+    def _add(self,tree,taxon,count=1):
         i = taxon.pop(0) if taxon else 0
         if i:
             if i in tree:
-                tree[i]['count']+=1
+                tree[i]['count']+=count
             else:
-                tree[i]={"count":1}
-            self._add(tree[i],taxon)
+                tree[i]={"count":count}
+            self._add(tree[i],taxon,count)
 
 
     def lca(self,min_count,total,method):
@@ -52,10 +177,10 @@ class TTree(object):
         elif method == 'majority':
             self.taxon = self.create_majority_lca(self.tree,self.taxon,min_count,total)
         else:
-            self.logger.error("\n# [ERROR] Unknown method")
+            logging.getLogger().error("\n# [ERROR] Unknown method")
             sys.exit()
         if not self.taxon:
-            self.taxon = "Unknown"
+            self.taxon = b"Unknown"
         return self.taxon
 
     # Create majority LCA:
@@ -71,9 +196,9 @@ class TTree(object):
                 if tree[b]['count']<min:
                     continue
                 if tree[b]['count'] in counts:
-                    return self.create_majority_lca(tree[b],t + str(b) + ";",min,total)
+                    return self.create_majority_lca(tree[b],t + b + b";",min,total)
         else:
-            return t.replace(";;",";")
+            return t.replace(b";;",b";")
 
 
     # Create LCA:
@@ -87,8 +212,8 @@ class TTree(object):
                 if b == "count":
                     continue
                 if tree[b]['count']>=min:
-                    return self.create_lca(tree[b],t + str(b) + ";",min)
-        return t.replace(";;",";")
+                    return self.create_lca(tree[b],t + b + b";",min)
+        return t.replace(b";;",b";")
 
 
     # remove species 
@@ -100,7 +225,7 @@ class TTree(object):
         #    return ts[:ts.index("unknown")]
         #except ValueError:
         #    return ts 
-        ts = string.split(";")
+        ts = string.split(b";")
         return ts
 
 
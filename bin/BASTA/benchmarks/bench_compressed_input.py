@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+import io
+import os
+import sys
+import gzip
+import random
+import shutil
+import argparse
+import logging
+import tempfile
+import timeit
+
+# Quick'n'Dirty! Change!
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from basta import FileUtils as futils
+
+import bench_io
+
+############
+#
+#   Benchmark of parsing compressed hit files: decompressing to
+#   disk before parsing compared to parsing while decompressing in
+#   the same thread and in a background thread (hit_gen)
+#
+####
+#   COPYRIGHT DISCLAIMER:
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   Author: BASTA contributors
+#   Date:   October 2026
+#
+
+
+CONFIG = {'query_id':0,'subject_id':1,'evalue':10,'align_length':3,'pident':2}
+
+
+def main(args):
+
+    logging.basicConfig(format='',level=logging.INFO)
+    logger = logging.getLogger()
+
+    random.seed(args.seed)
+    work = tempfile.mkdtemp(prefix="basta_bench_")
+    try:
+        plain = os.path.join(work,"hits.tsv")
+        bench_io._write_hits(plain,args.lines)
+        size = os.path.getsize(plain)/1e6
+        logger.info("# %d lines, %.1f MB\n# format\tmethod\tsec\tMB/sec\tlines/sec" % (args.lines,size))
+        t = _best(args,lambda: _parse(plain))
+        logger.info("plain\thit_gen\t%.3f\t%.1f\t%.0f" % (t,size/t,args.lines/t))
+
+        formats = [("gzip",_write_gzip,_gzip_reader)]
+        if futils.zstandard is not None:
+            formats.append(("zstd",_write_zstd,_zstd_reader))
+        else:
+            logger.warning("\n# [BASTA WARNING] Skipping zstd: Python package zstandard not installed")
+        for (name,write,reader) in formats:
+            path = os.path.join(work,"hits." + name)
+            write(plain,path)
+            methods = [
+                ("decompress to disk, then hit_gen",lambda: _decompress_then_parse(reader,path,os.path.join(work,"tmp.tsv"))),
+                ("hit_gen, same thread",lambda: _parse_reader(reader,path)),
+                ("hit_gen, background thread",lambda: _parse(path)),
+            ]
+            for (method,f) in methods:
+                t = _best(args,f)
+                logger.info("%s\t%s\t%.3f\t%.1f\t%.0f" % (name,method,t,size/t,args.lines/t))
+    finally:
+        shutil.rmtree(work)
+
+
+def _best(args,f):
+    return min(timeit.repeat(f,number=1,repeat=args.repeat))
+
+
+def _parse(path):
+    return sum(len(h) for h in futils.hit_gen(path,1,1e-5,80,CONFIG,0))
+
+
+# hit_gen reading from a decompressing file object
+def _parse_reader(reader,path):
+    with reader(path) as f:
+        return sum(len(h) for h in futils.hit_gen(f,1,1e-5,80,CONFIG,0))
+
+
+def _decompress_then_parse(reader,path,tmp):
+    with reader(path) as f:
+        with open(tmp,"wb") as out:
+            shutil.copyfileobj(f,out,futils.BUFFER_SIZE)
+    n = _parse(tmp)
+    os.remove(tmp)
+    return n
+
+
+def _write_gzip(plain,path):
+    with open(plain,"rb") as f:
+        with gzip.open(path,"wb") as out:
+            shutil.copyfileobj(f,out,futils.BUFFER_SIZE)
+
+
+def _gzip_reader(path):
+    return gzip.open(path,"rb")
+
+
+def _write_zstd(plain,path):
+    with open(plain,"rb") as f:
+        with open(path,"wb") as out:
+            futils.zstandard.ZstdCompressor().copy_stream(f,out)
+
+
+def _zstd_reader(path):
+    reader = futils.zstandard.ZstdDecompressor().stream_reader(open(path,"rb"),read_across_frames=True,closefd=True)
+    return io.BufferedReader(reader,futils.BUFFER_SIZE)
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parsing gzip and zstd compressed hit files")
+    parser.add_argument("-n", "--lines", help="number of hit lines (default: 1000000)", type=int, default=1000000)
+    parser.add_argument("-r", "--repeat", help="number of repetitions, best is reported (default: 3)", type=int, default=3)
+    parser.add_argument("-s", "--seed", help="random seed (default: 1)", type=int, default=1)
+    args = parser.parse_args()
+    main(args)
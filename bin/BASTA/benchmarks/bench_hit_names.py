@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import random
+import argparse
+import logging
+import timeit
+
+# Quick'n'Dirty! Change!
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from basta import FileUtils as futils
+
+############
+#
+#   Micro-benchmark of subject ID to accession conversion
+#
+####
+#   COPYRIGHT DISCLAIMER:
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   Author: BASTA contributors
+#   Date:   October 2026
+#
+
+
+
+def main(args):
+
+    logging.basicConfig(format='',level=logging.INFO)
+    logger = logging.getLogger()
+
+    random.seed(args.seed)
+    logger.info("# convention\tmethod\tns/hit\tspeedup")
+    for conv in ['gi','db','plain']:
+        ids = _subject_ids(conv,args.hits,args.distinct)
+        base = _time(futils._get_hit_name,ids,args.repeat)
+        logger.info("%s\t_get_hit_name\t%.1f\t1.00" % (conv,base))
+        fast = "fast path" if conv in futils.CONVENTIONS else "no fast path"
+        for (name,f) in [(fast,futils.hit_namer(conv,0)),(fast + " + memo",futils.hit_namer(conv))]:
+            t = _time(f,ids,args.repeat)
+            logger.info("%s\t%s\t%.1f\t%.2f" % (conv,name,t,base/t))
+
+
+
+# Subject IDs drawn from a smaller set of distinct
+# accessions, as hits repeat across queries
+def _subject_ids(conv,n,distinct):
+    accs = ["%s_%09d.%d" % (random.choice(["WP","XP","NP","YP"]),random.randint(0,999999999),random.randint(1,3)) for i in range(distinct)]
+    if conv == 'gi':
+        accs = ["gi|%d|ref|%s|" % (random.randint(1,999999999),a) for a in accs]
+    elif conv == 'db':
+        accs = ["ref|%s|" % (a) for a in accs]
+    return [futils.to_bytes(random.choice(accs)) for i in range(n)]
+
+
+# Best time per subject ID in nanoseconds
+def _time(f,ids,repeat):
+    t = min(timeit.repeat(lambda: [f(x) for x in ids],number=1,repeat=repeat))
+    return t/len(ids)*1e9
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark conversion of subject IDs to accessions")
+    parser.add_argument("-n", "--hits", help="number of subject IDs (default: 1000000)", type=int, default=1000000)
+    parser.add_argument("-u", "--distinct", help="number of distinct subject IDs (default: 50000)", type=int, default=50000)
+    parser.add_argument("-r", "--repeat", help="number of repetitions, best is reported (default: 3)", type=int, default=3)
+    parser.add_argument("-s", "--seed", help="random seed (default: 1)", type=int, default=1)
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import random
+import argparse
+import logging
+import tempfile
+import timeit
+
+# Quick'n'Dirty! Change!
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from basta import FileUtils as futils
+
+############
+#
+#   Benchmark of reading hit files as bytes compared to
+#   decoding each line as text
+#
+####
+#   COPYRIGHT DISCLAIMER:
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   Author: BASTA contributors
+#   Date:   October 2026
+#
+
+
+
+def main(args):
+
+    logging.basicConfig(format='',level=logging.INFO)
+    logger = logging.getLogger()
+
+    random.seed(args.seed)
+    (fd,path) = tempfile.mkstemp(suffix=".tsv")
+    os.close(fd)
+    try:
+        _write_hits(path,args.lines)
+        size = os.path.getsize(path)/1e6
+        logger.info("# %d lines, %.1f MB\n# method\tsec\tMB/sec\tlines/sec" % (args.lines,size))
+        config = {'query_id':0,'subject_id':1,'evalue':10,'align_length':3,'pident':2}
+        results = [("text, decode per line",_text),("bytes, large buffer",_bytes),("hit_gen",_hit_gen)]
+        for (name,f) in results:
+            t = min(timeit.repeat(lambda: f(path,config),number=1,repeat=args.repeat))
+            logger.info("%s\t%.3f\t%.1f\t%.0f" % (name,t,size/t,args.lines/t))
+    finally:
+        os.remove(path)
+
+
+
+def _write_hits(path,n):
+    accs = ["WP_%09d.1" % (random.randint(0,999999999)) for i in range(10000)]
+    with open(path,"w") as f:
+        for i in range(n):
+            f.write("read_%d\t%s\t%.1f\t%d\t0\t0\t1\t100\t1\t100\t%.2e\t%.1f\n" % (i//5,random.choice(accs),random.uniform(70,100),random.randint(20,150),random.uniform(0,1e-5),random.uniform(30,300)))
+
+
+# Previous way of reading: text mode, keys encoded for LevelDB
+def _text(path,config):
+    keys = 0
+    with open(path,"r") as f:
+        for line in f:
+            ls = line.split("\t")
+            if float(ls[config['pident']]) >= 80 and float(ls[config['evalue']]) <= 1e-5 and int(ls[config['align_length']]) >= 1:
+                futils.to_bytes(ls[config['subject_id']].split(".")[0])
+                keys += 1
+    return keys
+
+
+def _bytes(path,config):
+    keys = 0
+    with futils.open_binary(path) as f:
+        for line in f:
+            ls = line.split(b"\t")
+            if float(ls[config['pident']]) >= 80 and float(ls[config['evalue']]) <= 1e-5 and int(ls[config['align_length']]) >= 1:
+                ls[config['subject_id']].split(b".")[0]
+                keys += 1
+    return keys
+
+
+def _hit_gen(path,config):
+    return sum(len(h) for h in futils.hit_gen(path,1,1e-5,80,config,0))
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark reading hit files as bytes and as text")
+    parser.add_argument("-n", "--lines", help="number of hit lines (default: 1000000)", type=int, default=1000000)
+    parser.add_argument("-r", "--repeat", help="number of repetitions, best is reported (default: 3)", type=int, default=3)
+    parser.add_argument("-s", "--seed", help="random seed (default: 1)", type=int, default=1)
+    args = parser.parse_args()
+    main(args)
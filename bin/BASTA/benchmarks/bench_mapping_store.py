@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import logging
+import tempfile
+import timeit
+
+# Quick'n'Dirty! Change!
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from basta import DBUtils as db
+from basta import SortedIndex
+from basta import DBBackends
+
+import synthetic_data
+
+############
+#
+#   Benchmark of the accession -> taxon ID stores on a synthetic
+#   accession2taxid file: build time, size on disk, time to open
+#   and lookup throughput of present and missing accessions, one by
+#   one and in batches (multi_get).
+#
+####
+#   COPYRIGHT DISCLAIMER:
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   Author: BASTA contributors
+#   Date:   October 2026
+#
+
+
+# Store name, name of the database created from the
+# mapping file and its backend
+STORES = [
+    ("leveldb","synth_mapping.db","leveldb"),
+    ("sqlite","synth_sqlite_mapping.db","sqlite"),
+    ("lmdb","synth_lmdb_mapping.db","lmdb"),
+    ("index","synth_mapping" + SortedIndex.SUFFIX,None),
+]
+
+
+def main(args):
+
+    logging.basicConfig(format='',level=logging.INFO)
+    logger = logging.getLogger()
+
+    stores = [s for s in STORES if not args.stores or s[0] in args.stores]
+    work = args.keep or tempfile.mkdtemp(prefix="basta_bench_")
+    if not os.path.isdir(work):
+        os.makedirs(work)
+    try:
+        logger.info("\n# [BASTA STATUS] Generating synthetic data in %s" % (work))
+        synthetic_data.generate(work,args.species,args.accessions,1,1,0,args.seed)
+        (present,missing) = _keys(args)
+        logger.setLevel(logging.WARNING)
+        results = []
+        for (name,db_file,backend) in stores:
+            if backend == "lmdb" and DBBackends.lmdb is None:
+                logger.warning("\n# [BASTA WARNING] Skipping lmdb: Python package lmdb not installed")
+                continue
+            res = _measure(work,db_file,backend,present,missing,args.batch)
+            res['store'] = name
+            results.append(res)
+            sys.stderr.write("%s\tbuild %.2fsec\t%.1f MB\topen %.4fsec\t%.0f hits/sec\t%.0f misses/sec\t%.0f multi_get/sec\n" % (name,res['build_sec'],res['size_mb'],res['open_sec'],res['present_per_sec'],res['missing_per_sec'],res['multi_get_per_sec']))
+    finally:
+        if not args.keep:
+            shutil.rmtree(work)
+
+    report = {
+        'created':time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python':platform.python_version(),
+        'platform':platform.platform(),
+        'data':{'species':args.species,'accessions':args.accessions,'lookups':args.lookups,'batch':args.batch,'seed':args.seed},
+        'stores':results,
+    }
+    if args.output == "-":
+        json.dump(report,sys.stdout,indent=2,sort_keys=True)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output,"w") as f:
+            json.dump(report,f,indent=2,sort_keys=True)
+
+
+# Random accessions of the mapping file and accessions not in it
+def _keys(args):
+    rnd = random.Random(args.seed)
+    present = [synthetic_data._acc(rnd.randint(0,args.accessions-1)).encode() for i in range(args.lookups)]
+    missing = [synthetic_data._acc(args.accessions + rnd.randint(0,args.accessions)).encode() for i in range(args.lookups)]
+    return (present,missing)
+
+
+def _measure(work,db_file,backend,present,missing,batch):
+    path = os.path.join(work,db_file)
+    start = timeit.default_timer()
+    db.create_db(work,synthetic_data.MAPPING,db_file,0,2,0,backend)
+    build = timeit.default_timer() - start
+
+    start = timeit.default_timer()
+    lookup = db._init_db(path)
+    opened = timeit.default_timer() - start
+    rates = []
+    for keys in [present,missing]:
+        start = timeit.default_timer()
+        found = sum(1 for k in keys if lookup.get(k) is not None)
+        elapsed = timeit.default_timer() - start
+        rates.append((found,len(keys)/elapsed if elapsed else 0.0))
+    # half present, half missing accessions
+    keys = [k for pair in zip(present,missing) for k in pair]
+    start = timeit.default_timer()
+    for i in range(0,len(keys),batch):
+        lookup.multi_get(keys[i:i+batch])
+    elapsed = timeit.default_timer() - start
+    lookup.close()
+    return {
+        'build_sec':build,
+        'size_mb':_size(path)/1e6,
+        'open_sec':opened,
+        'present_found':rates[0][0],
+        'present_per_sec':rates[0][1],
+        'missing_found':rates[1][0],
+        'missing_per_sec':rates[1][1],
+        'multi_get_per_sec':len(keys)/elapsed if elapsed else 0.0,
+    }
+
+
+def _size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path,f)) for f in os.listdir(path))
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the accession to taxon ID stores on synthetic data and write the results as JSON")
+    parser.add_argument("-o", "--output", help="JSON output file, - for stdout (default: -)", default="-")
+    parser.add_argument("-t", "--stores", help="stores to benchmark (default: all of %s)" % (", ".join(s[0] for s in STORES)), nargs="+", default=[])
+    parser.add_argument("-k", "--keep", help="generate data in and keep this directory", default="")
+    parser.add_argument("-S", "--species", help="number of species (default: 2000)", type=int, default=2000)
+    parser.add_argument("-a", "--accessions", help="number of accessions (default: 1000000)", type=int, default=1000000)
+    parser.add_argument("-n", "--lookups", help="number of present and of missing accessions looked up (default: 200000)", type=int, default=200000)
+    parser.add_argument("-b", "--batch", help="number of accessions per multi_get (default: 1000)", type=int, default=1000)
+    parser.add_argument("-s", "--seed", help="random seed (default: 1)", type=int, default=1)
+    args = parser.parse_args()
+    main(args)
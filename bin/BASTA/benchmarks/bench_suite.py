@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import logging
+import resource
+import tempfile
+import timeit
+import multiprocessing
+
+# Quick'n'Dirty! Change!
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from basta import FileUtils as futils
+from basta import TaxTree as ttree
+from basta import DBUtils as db
+from basta import AssignTaxonomy
+from basta import NCBITaxonomyCreator as ntc
+
+import synthetic_data
+
+############
+#
+#   Benchmark of the BASTA hot paths on synthetic data. Each stage
+#   runs in its own process so the peak memory can be reported per
+#   stage. Results are written as JSON.
+#
+####
+#   COPYRIGHT DISCLAIMER:
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   Author: BASTA contributors
+#   Date:   October 2026
+#
+
+
+MAPPING_DB = "synth_mapping.db"
+
+# Stage name, function and unit of the counted items
+STAGES = [
+    ("taxonomy_build",'_taxonomy_build',"taxa"),
+    ("create_db_taxonomy",'_create_db_taxonomy',"lines"),
+    ("create_db_mapping",'_create_db_mapping',"lines"),
+    ("hit_gen",'_hit_gen',"hits"),
+    ("tax_list",'_tax_list',"hits"),
+    ("lca",'_lca',"queries"),
+    ("sequence",'_sequence',"queries"),
+]
+
+
+def main(args):
+
+    logging.basicConfig(format='',level=logging.INFO)
+    logger = logging.getLogger()
+
+    stages = [s for s in STAGES if not args.stages or s[0] in args.stages]
+    work = args.keep or tempfile.mkdtemp(prefix="basta_bench_")
+    if not os.path.isdir(work):
+        os.makedirs(work)
+    try:
+        logger.info("\n# [BASTA STATUS] Generating synthetic data in %s" % (work))
+        counts = synthetic_data.generate(work,args.species,args.accessions,args.queries,args.hits,args.missing,args.seed)
+        logger.setLevel(logging.WARNING)
+        results = []
+        for (name,func,unit) in STAGES:
+            # later stages need the databases, so skipped stages still run
+            res = _measure(func,work,args)
+            if (name,func,unit) not in stages:
+                continue
+            res['stage'] = name
+            res['unit'] = unit
+            res['items_per_sec'] = res['items']/res['wall_sec'] if res['wall_sec'] else 0.0
+            results.append(res)
+            sys.stderr.write("%s\t%d %s\t%.3fsec\t%.0f %s/sec\t%.1f MB\n" % (name,res['items'],unit,res['wall_sec'],res['items_per_sec'],unit,res['peak_rss_mb']))
+    finally:
+        if not args.keep:
+            shutil.rmtree(work)
+
+    report = {
+        'created':time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python':platform.python_version(),
+        'platform':platform.platform(),
+        'data':dict(counts,species=args.species,queries=args.queries,max_hits=args.hits,missing=args.missing,seed=args.seed),
+        'stages':results,
+    }
+    if args.output == "-":
+        json.dump(report,sys.stdout,indent=2,sort_keys=True)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output,"w") as f:
+            json.dump(report,f,indent=2,sort_keys=True)
+
+
+# Run one stage in a child process and collect its
+# timings and peak resident memory
+def _measure(func,work,args):
+    q = multiprocessing.Queue()
+    p = multiprocessing.Process(target=_child,args=(q,func,work,args))
+    p.start()
+    res = q.get()
+    p.join()
+    if 'error' in res:
+        logging.getLogger().error("\n# [BASTA ERROR] Stage %s failed: %s" % (func,res['error']))
+        sys.exit(1)
+    return res
+
+
+def _child(q,func,work,args):
+    try:
+        logging.getLogger().setLevel(logging.WARNING)
+        timer = _Timer()
+        items = globals()[func](work,args,timer)
+        (wall,cpu) = timer.stop()
+        q.put({'items':items,'wall_sec':wall,'cpu_sec':cpu,'peak_rss_mb':_peak_rss()})
+    except BaseException as e:
+        q.put({'error':repr(e)})
+
+
+# Wall and CPU time from the last start to the first stop. Stages
+# with setup or counting steps start and stop the timer themselves.
+class _Timer():
+
+    def __init__(self):
+        self.start()
+
+    def start(self):
+        self.elapsed = None
+        self.wall = timeit.default_timer()
+        self.cpu = _cpu()
+
+    def stop(self):
+        if self.elapsed is None:
+            self.elapsed = (timeit.default_timer() - self.wall,_cpu() - self.cpu)
+        return self.elapsed
+
+
+def _cpu():
+    t = os.times()
+    return t[0] + t[1]
+
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+def _peak_rss():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return rss/1e6
+    return rss/1e3
+
+
+def _taxonomy_build(work,args,timer):
+    creator = ntc.Creator(os.path.join(work,synthetic_data.NAMES),os.path.join(work,synthetic_data.NODES))
+    creator._write(os.path.join(work,"complete_taxa"))
+    timer.stop()
+    return len(creator.names)
+
+
+def _create_db_taxonomy(work,args,timer):
+    db.create_db(work,"complete_taxa.gz","complete_taxa.db",0,1)
+    timer.stop()
+    return _count_lines(os.path.join(work,"complete_taxa.gz")) - 1
+
+
+def _create_db_mapping(work,args,timer):
+    db.create_db(work,synthetic_data.MAPPING,MAPPING_DB,0,2)
+    timer.stop()
+    return _count_lines(os.path.join(work,synthetic_data.MAPPING)) - 1
+
+
+def _hit_gen(work,args,timer):
+    return sum(len(h) for seq_hits in _parse(work) for h in seq_hits.values())
+
+
+# Lookups are timed on already parsed hits
+def _tax_list(work,args,timer):
+    parsed = [h for seq_hits in _parse(work) for h in seq_hits.values()]
+    (assigner,tax_lookup,map_lookup) = _assigner(work,args)
+    missing = AssignTaxonomy.MissingIDs()
+    timer.start()
+    for hits in parsed:
+        assigner._get_tax_list(hits,map_lookup,tax_lookup,[],missing)
+    return sum(len(h) for h in parsed)
+
+
+# LCAs are timed on already resolved lineages
+def _lca(work,args,timer):
+    (assigner,tax_lookup,map_lookup) = _assigner(work,args)
+    missing = AssignTaxonomy.MissingIDs()
+    resolved = []
+    for seq_hits in _parse(work):
+        for hits in seq_hits.values():
+            taxa = []
+            assigner._get_tax_list(hits,map_lookup,tax_lookup,taxa,missing)
+            resolved.append(taxa)
+    timer.start()
+    for taxa in resolved:
+        ttree.get_lca(taxa,args.minimum,False,args.method)
+    return len(resolved)
+
+
+def _sequence(work,args,timer):
+    (assigner,tax_lookup,map_lookup) = _assigner(work,args)
+    assigner.processes = args.processes
+    if args.lca_cache:
+        assigner.lca_memo = ttree.LCAMemo(args.lca_cache)
+    timer.start()
+    assigner._assign_sequence(os.path.join(work,synthetic_data.HITS),MAPPING_DB,False)
+    timer.stop()
+    return _count_lines(os.path.join(work,"sequence.out"))
+
+
+def _parse(work):
+    return futils.hit_gen(os.path.join(work,synthetic_data.HITS),1,1e-5,80,{'query_id':0,'subject_id':1,'evalue':10,'align_length':3,'pident':2},0)
+
+
+def _assigner(work,args):
+    assigner = AssignTaxonomy.Assigner(1e-5,1,80,0,args.minimum,False,args.method,work,None,os.path.join(work,"sequence.out"))
+    tax_lookup = db._init_db(os.path.join(work,"complete_taxa.db"))
+    map_lookup = db._init_db(os.path.join(work,MAPPING_DB))
+    assigner.lookups = (tax_lookup,map_lookup)
+    return (assigner,tax_lookup,map_lookup)
+
+
+def _count_lines(path):
+    with futils.open_binary(path) as f:
+        return sum(1 for line in f)
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark BASTA stages on synthetic data and write the results as JSON")
+    parser.add_argument("-o", "--output", help="JSON output file, - for stdout (default: -)", default="-")
+    parser.add_argument("-t", "--stages", help="stages to report (default: all of %s)" % (", ".join(s[0] for s in STAGES)), nargs="+", default=[])
+    parser.add_argument("-k", "--keep", help="generate data in and keep this directory", default="")
+    parser.add_argument("-S", "--species", help="number of species (default: 2000)", type=int, default=2000)
+    parser.add_argument("-a", "--accessions", help="number of accessions (default: 100000)", type=int, default=100000)
+    parser.add_argument("-q", "--queries", help="number of query sequences (default: 20000)", type=int, default=20000)
+    parser.add_argument("-H", "--hits", help="maximum number of hits per query (default: 20)", type=int, default=20)
+    parser.add_argument("-m", "--missing", help="fraction of hits without mapping (default: 0.01)", type=float, default=0.01)
+    parser.add_argument("-s", "--seed", help="random seed (default: 1)", type=int, default=1)
+    parser.add_argument("-l", "--method", help="LCA method (default: majority)", choices=['all','majority'], default="majority")
+    parser.add_argument("-n", "--minimum", help="minimum number of hits for the LCA (default: 1)", type=int, default=1)
+    parser.add_argument("-p", "--processes", help="processes for the sequence stage, 0 runs it sequentially (default: 0)", type=int, default=0)
+    parser.add_argument("-L", "--lca_cache", help="LCA memo size for the sequence stage, 0 disables it (default: 20000)", type=int, default=20000)
+    args = parser.parse_args()
+    main(args)
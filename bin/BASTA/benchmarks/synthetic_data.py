@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+import os
+import gzip
+import random
+import argparse
+import logging
+
+
+############
+#
+#   Generator of synthetic BASTA input: a miniature NCBI
+#   nodes/names dump, an accession2taxid file and a hit file
+#
+####
+#   COPYRIGHT DISCLAIMER:
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   Author: BASTA contributors
+#   Date:   October 2026
+#
+
+
+RANKS = ['superkingdom','phylum','class','order','family','genus','species']
+
+# File names inside the output directory
+NODES = "nodes.dmp"
+NAMES = "names.dmp"
+MAPPING = "synth.accession2taxid.gz"
+HITS = "hits.tsv"
+
+
+def main(args):
+
+    logging.basicConfig(format='',level=logging.INFO)
+    logger = logging.getLogger()
+
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+    counts = generate(args.output,args.species,args.accessions,args.queries,args.hits,args.missing,args.seed)
+    logger.info("\n# [BASTA STATUS] Wrote %d taxa, %d accessions and %d hits to %s" % (counts['taxa'],counts['accessions'],counts['hits'],args.output))
+
+
+# Write all synthetic files to out_dir and return the
+# number of taxa, accessions and hit lines written
+def generate(out_dir,species,accessions,queries,hits,missing=0.01,seed=1):
+    rnd = random.Random(seed)
+    levels = _write_taxonomy(out_dir,species,rnd)
+    acc_species = _write_mapping(out_dir,levels[-1],accessions,rnd)
+    hit_lines = _write_hits(out_dir,levels,acc_species,queries,hits,missing,rnd)
+    return {'taxa':sum(len(l) for l in levels) + 1,'accessions':accessions,'hits':hit_lines}
+
+
+# Build a seven rank tree below the root (taxon 1). Level k has
+# about species^((k+1)/7) nodes, each attached to a random node
+# of the level above. Returns one list of (taxon,parent) per rank.
+def _write_taxonomy(out_dir,species,rnd):
+    levels = []
+    next_id = 2
+    parents = [1]
+    for (k,rank) in enumerate(RANKS):
+        size = max(len(parents),int(round(species ** ((k+1)/7.0))))
+        level = []
+        for i in range(size):
+            # every parent gets at least one child
+            parent = parents[i] if i < len(parents) else rnd.choice(parents)
+            level.append((next_id,parent))
+            next_id += 1
+        levels.append(level)
+        parents = [x[0] for x in level]
+
+    with open(os.path.join(out_dir,NODES),"w") as nodes, open(os.path.join(out_dir,NAMES),"w") as names:
+        nodes.write("1\t|\t1\t|\tno rank\t|\n")
+        names.write("1\t|\troot\t|\t\t|\tscientific name\t|\n")
+        for (rank,level) in zip(RANKS,levels):
+            for (taxon,parent) in level:
+                nodes.write("%d\t|\t%d\t|\t%s\t|\n" % (taxon,parent,rank))
+                names.write("%d\t|\t%s %d\t|\t\t|\tscientific name\t|\n" % (taxon,rank.capitalize(),taxon))
+    return levels
+
+
+# Every accession maps to a random species.
+# Returns the species of each accession.
+def _write_mapping(out_dir,species,accessions,rnd):
+    acc_species = []
+    with gzip.open(os.path.join(out_dir,MAPPING),"wb") as f:
+        f.write(b"accession\taccession.version\ttaxid\tgi\n")
+        for i in range(accessions):
+            taxon = rnd.choice(species)[0]
+            acc_species.append(taxon)
+            f.write(("%s\t%s.1\t%d\t%d\n" % (_acc(i),_acc(i),taxon,i+1)).encode())
+    return acc_species
+
+
+# Hits of a query mostly come from accessions of one genus, the rest
+# is spread over the whole tree. A fraction of the hits point to
+# accessions that are not in the mapping file.
+def _write_hits(out_dir,levels,acc_species,queries,hits,missing,rnd):
+    genus = dict(levels[-1])
+    by_genus = {}
+    for (i,s) in enumerate(acc_species):
+        by_genus.setdefault(genus[s],[]).append(i)
+    genera = list(by_genus)
+    lines = 0
+    with open(os.path.join(out_dir,HITS),"w") as f:
+        for q in range(queries):
+            pool = by_genus[rnd.choice(genera)]
+            for h in range(rnd.randint(1,hits)):
+                if rnd.random() < missing:
+                    acc = _acc(len(acc_species) + rnd.randint(0,len(acc_species)))
+                elif rnd.random() < 0.8:
+                    acc = _acc(rnd.choice(pool))
+                else:
+                    acc = _acc(rnd.randint(0,len(acc_species)-1))
+                f.write("query_%d\t%s.1\t%.1f\t%d\t0\t0\t1\t100\t1\t100\t%.2e\t%.1f\n" % (q,acc,rnd.uniform(70,100),rnd.randint(20,150),rnd.uniform(0,1e-5),rnd.uniform(30,300)))
+                lines += 1
+    return lines
+
+
+def _acc(i):
+    return "SY%07d" % (i)
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic taxonomy, mapping and hit files for BASTA")
+    parser.add_argument("output", help="output directory")
+    parser.add_argument("-S", "--species", help="number of species (default: 2000)", type=int, default=2000)
+    parser.add_argument("-a", "--accessions", help="number of accessions (default: 100000)", type=int, default=100000)
+    parser.add_argument("-q", "--queries", help="number of query sequences (default: 20000)", type=int, default=20000)
+    parser.add_argument("-H", "--hits", help="maximum number of hits per query (default: 20)", type=int, default=20)
+    parser.add_argument("-m", "--missing", help="fraction of hits without mapping (default: 0.01)", type=float, default=0.01)
+    parser.add_argument("-s", "--seed", help="random seed (default: 1)", type=int, default=1)
+    args = parser.parse_args()
+    main(args)
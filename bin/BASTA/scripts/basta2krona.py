@@ -6,6 +6,10 @@ import argparse
 import subprocess
 import tempfile
 
+# Quick'n'Dirty! Change!
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from basta import FileUtils as futils
+
 ############
 #
 #  Create Krona plot from BASTA classification 
@@ -47,8 +51,8 @@ def _writeKrona(counts,of):
         pathfd,path = tempfile.mkstemp()
         with os.fdopen(pathfd,"w") as tf:
             for tax in counts[c]:
-                ts = "root\t" + "\t".join(tax.split(";"))
-                tf.write("%s\t%s" % (counts[c][tax],ts))
+                ts = "root\t" + "\t".join(tax.rstrip("\n").split(";"))
+                tf.write("%s\t%s\n" % (counts[c][tax],ts))
         paths.append(str(path) + "," + str(fn))
     fn_str = " ".join(paths)
     cmd = "ktImportText -o %s %s" % (of,fn_str)
@@ -58,12 +62,16 @@ def _writeKrona(counts,of):
 
 
 
+# Plain or compressed (e.g. written as .gz by basta) files
 def _parseBASTA(bf):
 
     counts = {}
-    with open(bf,"r") as f:
-        for line in f:
-            ls = filter(None,line.split("\t"))
+    with futils.open_hit_file(bf) as f:
+        lines = (futils.to_str(line) for line in f)
+        for line in lines:
+            if line.startswith("#rank"):
+                return _parseAbundance(lines)
+            ls = [x for x in line.split("\t") if x]
             try:
                 counts[ls[1]] += 1 
             except KeyError:
@@ -71,10 +79,21 @@ def _parseBASTA(bf):
     return counts
 
 
+# Abundance table written by basta sequence -A: queries
+# assigned to each taxon are in column lca_queries
+def _parseAbundance(lines):
+    counts = {}
+    for line in lines:
+        ls = line.rstrip("\n").split("\t")
+        if int(ls[3]):
+            counts[ls[1]] = int(ls[3])
+    return counts
+
+
 
 if __name__=="__main__":
     parser = argparse.ArgumentParser(description="Create Krona plots from basta output files")
-    parser.add_argument("input", help="BASTA annotation file(s) separated by comma")
+    parser.add_argument("input", help="BASTA annotation file(s) or abundance table(s) (basta sequence -A) separated by comma")
     parser.add_argument("output", help="Output file")
 
     args =  parser.parse_args()
@@ -4,10 +4,14 @@ import os
 import sys
 import argparse
 import logging
+import gzip
+import shutil
+from multiprocessing.pool import ThreadPool
 
 # Quick'n'Dirty! Change!
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from basta import DBUtils as db
+from basta import FileUtils as futils
 
 ############
 #
@@ -41,49 +45,140 @@ def main(args):
     logging.basicConfig(format='',level=logging.INFO)
     logger = logging.getLogger()
 
-    logger.info("\n# [STATUS] Exporting mapping file")
-    _fetch_mapping(args,logger)
-
-    logger.info("\n# [STATUS] Exporting taxonomies file")
-    _fetch_taxonomies(args,logger)
-
-
-   
-
-def _fetch_mapping(args,logger):
     logger.info("\n# [STATUS] Initializing mapping database")
     db_file = db.get_db_name(args.directory,args.dbtype)
     map_lookup = db._init_db(os.path.abspath(os.path.join(args.directory,db_file)))
-    with open(args.mapout,"w") as f:
-        for k,v in map_lookup:
-            f.write("%s\t%s\n" % (k,v))
 
+    logger.info("\n# [STATUS] Initializing taxonomy database")
+    tax_lookup = db._init_db(os.path.join(args.directory,"complete_taxa.db"))
 
+    ranges = _key_ranges(map_lookup,args.prefix)
+    logger.info("\n# [STATUS] Exporting mapping and taxonomies in %d key ranges (%d workers)" % (len(ranges),args.workers))
+
+    # LevelDB only allows one process to hold the database lock, so the
+    # key ranges are exported by threads sharing the same handles. Both
+    # the iteration and the zlib compression release the GIL.
+    pool = ThreadPool(args.workers)
+    parts = pool.map(lambda x: _export_range(map_lookup,tax_lookup,x[0],x[1],args),enumerate(ranges))
+    pool.close()
+    pool.join()
+
+    _concat([p[0] for p in parts],args.mapout)
+    not_found = set()
+    for p in parts:
+        not_found.update(p[2])
+
+    if args.distinct:
+        logger.info("\n# [STATUS] Exporting distinct taxonomies")
+        taxids = set()
+        for p in parts:
+            taxids.update(p[1])
+        not_found.update(_write_distinct(tax_lookup,taxids,args.dbout))
+    else:
+        _concat([p[1] for p in parts],args.dbout)
+
+    if not_found:
+        logger.warning("\n# [WARNING] No taxon found for %d taxon IDs (e.g. %s)" % (len(not_found),", ".join(futils.to_str(x) for x in sorted(not_found)[:10])))
+
+    map_lookup.close()
+    tax_lookup.close()
+
+
+
+# Split the key space of the database into ranges by starting
+# at each distinct key prefix of the given length
+def _key_ranges(lookup,length):
+    prefixes = []
+    start = None
+    while True:
+        key = next(iter(lookup.iterator(start=start,include_value=False)),None)
+        if key is None:
+            break
+        prefixes.append(key[:length])
+        start = _successor(key[:length])
+        if start is None:
+            break
+
+    if not prefixes:
+        return [(None,None)]
+    starts = [None] + prefixes[1:]
+    stops = prefixes[1:] + [None]
+    return list(zip(starts,stops))
+
+
+# Smallest key that is larger than all keys starting with prefix
+def _successor(prefix):
+    b = bytearray(prefix)
+    while b:
+        if b[-1] < 255:
+            b[-1] += 1
+            return bytes(b)
+        b.pop()
+    return None
+
+
+
+# Export one key range of the mapping database. Returns the names
+# of the written part files (or the set of taxon IDs in distinct mode)
+# and the set of taxon IDs without taxonomy.
+def _export_range(map_lookup,tax_lookup,num,key_range,args):
+    (start,stop) = key_range
+    map_part = "%s.part%05d" % (args.mapout,num)
+    tax_part = "%s.part%05d" % (args.dbout,num)
+    taxa = {}
+    not_found = set()
+
+    mf = _open_out(map_part,args.mapout)
+    tf = None if args.distinct else _open_out(tax_part,args.dbout)
+    for k,v in map_lookup.iterator(start=start,stop=stop):
+        mf.write(b"%s\t%s\n" % (k,v))
+        if args.distinct:
+            taxa[v] = 1
+            continue
+        try:
+            tax_string = taxa[v]
+        except KeyError:
+            tax_string = tax_lookup.get(v)
+            taxa[v] = tax_string
+        if not tax_string:
+            not_found.add(v)
+            continue
+        tf.write(b"%s\t%s\n" % (v,tax_string))
+    mf.close()
+    if args.distinct:
+        return (map_part,set(taxa),not_found)
+    tf.close()
+    return (map_part,tax_part,not_found)
 
-def _fetch_taxonomies(args,logger):
-    tax_dict = {}
 
-    logger.info("\n# [STATUS] Initializing taxonomy database")
 
-    db_file = db.get_db_name(args.directory,args.dbtype)
-    map_lookup = db._init_db(os.path.abspath(os.path.join(args.directory,db_file)))
-    tax_lookup = db._init_db(os.path.join(args.directory,"complete_taxa.db"))
+# Write each taxon ID found in the mapping database once, walking the
+# taxonomy database in key order instead of one random lookup per ID.
+# Returns the taxon IDs that were not found.
+def _write_distinct(tax_lookup,taxids,out):
+    with _open_out(out,out) as f:
+        for k,v in tax_lookup:
+            if k in taxids:
+                f.write(b"%s\t%s\n" % (k,v))
+                taxids.discard(k)
+    return taxids
 
-    not_found = {}
 
-    with open(args.dbout,"w") as f:
-        for k,v in map_lookup:
-            tax_string = tax_lookup.get(v)
-            if not tax_string:
-                if v in not_found:
-                    continue
-                else:
-                    logger.warning("\n# [WARNING] No taxon found for %d " % (int(v)))
-                    not_found[v] = 1
-                    continue    
-            f.write("%s\t%s\n" % (v,tax_string))
-    
 
+# Concatenate part files in order. Gzip members can be concatenated
+# as they are, so compressed parts are never decompressed.
+def _concat(parts,out):
+    with open(out,"wb") as oh:
+        for p in parts:
+            with open(p,"rb") as ph:
+                shutil.copyfileobj(ph,oh,1024*1024)
+            os.remove(p)
+
+
+def _open_out(path,name):
+    if name.endswith(".gz"):
+        return gzip.open(path,"wb",compresslevel=6)
+    return open(path,"wb")
 
 
 def _get_seqs(lf):
@@ -103,6 +198,9 @@ if __name__ == "__main__":
     parser.add_argument("mapout", help="Output file for mapping file")
     parser.add_argument("dbtype", help="Type of mapping file to use, e.g. nucl (nt), prot (uniprot) etc")
     parser.add_argument("-d", "--directory", help="directory of database files (default: BASTA_ROOT/taxonomy)", default=os.path.abspath(os.path.join(os.path.dirname(__file__),"../taxonomy")))
+    parser.add_argument("-w", "--workers", help="number of key ranges exported concurrently (default: 4)", type=int, default=4)
+    parser.add_argument("-p", "--prefix", help="length of key prefix used to split the database into ranges (default: 2)", type=int, default=2)
+    parser.add_argument("-u", "--distinct", help="write each taxon ID only once to the taxonomy output", action="store_true")
     args = parser.parse_args()
     main(args)
 
@@ -8,6 +8,7 @@ import logging
 # Quick'n'Dirty! Change!
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from basta import DBUtils as db
+from basta import FileUtils as futils
 
 ############
 #
@@ -48,9 +49,9 @@ def main(args):
     taxa = _fetch_taxonomies(seqs,args,logger)
 
 
-    with open(args.output,"w") as f:
+    with open(args.output,"wb") as f:
         for s in taxa.keys():
-            f.write("%s\t%s\n" % (s,taxa[s]))
+            f.write(b"%s\t%s\n" % (s,taxa[s]))
     
 
 def _fetch_taxonomies(seqs,args,logger):
@@ -67,11 +68,11 @@ def _fetch_taxonomies(seqs,args,logger):
     for s in seqs:
         taxon_id = map_lookup.get(s)
         if not taxon_id:
-            logger.warning("\n# [WARNING] No mapping found for %s " % (s))
+            logger.warning("\n# [WARNING] No mapping found for %s " % (futils.to_str(s)))
             continue
         tax_string = tax_lookup.get(taxon_id)
         if not tax_string:
-            logger.warning("\n# [WARNING] No taxon found for %d " % (int(taxon_id)))
+            logger.warning("\n# [WARNING] No taxon found for %s " % (futils.to_str(taxon_id)))
             continue    
         tax_dict[s] = tax_string
     return tax_dict
@@ -81,9 +82,9 @@ def _fetch_taxonomies(seqs,args,logger):
 
 def _get_seqs(lf):
     seqs = []
-    with open(lf,"r") as f:
+    with open(lf,"rb") as f:
         for line in f:
-            seq=line.replace(" ","").replace("\n","")
+            seq=line.replace(b" ",b"").replace(b"\n",b"")
             seqs.append(seq)
     return seqs
 
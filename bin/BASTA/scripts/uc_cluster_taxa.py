@@ -4,6 +4,18 @@ import os
 import sys
 import argparse
 import logging
+from collections import OrderedDict
+
+# Quick'n'Dirty! Change!
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from basta import TaxTree as ttree
+from basta import FileUtils as futils
+
+try:
+    from sys import intern
+except ImportError:
+    pass
+
 ############
 #
 #   uc cluster taxa
@@ -39,23 +51,32 @@ def main(args):
     logger.info("\n[BASTA STATUS] Reading BASTA taxonomy\n")
     taxa = _get_taxa(args.basta)
 
-    logger.info("\n[BASTA STATUS] Reading Reading cluster file\n")
-    clusters = _get_clusters(args.uc,taxa)
+    logger.info("\n[BASTA STATUS] Reading cluster file and writing output file\n")
+    with open(args.output,"w") as oh:
+        for (centroid,members) in _cluster_gen(args.uc,taxa,args.grouped):
+            _print_cluster(oh,centroid,members,args)
+
 
-    logger.info("\n[BASTA STATUS] Writing output file\n")
-    _print_output(args.output,clusters)
 
+def _print_cluster(oh,centroid,members,args):
+    if args.consensus:
+        oh.write("#%s\t%s\n" % (centroid,_consensus(members,args.consensus,args.minimum)))
+    else:
+        oh.write("#%s\n" % (centroid))
+    for a in members:
+        oh.write("\t%s\n" % (a))
 
 
-def _print_output(output,clusters):
-    oh = open(output,"w")
-    for c in clusters:
-        oh.write("#%s\n" % (c))
-        for a in clusters[c]:
-            oh.write("\t%s\n" % (a))
-    oh.close()
+# LCA of all known member taxa of a cluster using the same
+# rules as BASTA's sequence assignment
+def _consensus(members,method,minimum):
+    known = [m for m in members if m not in ("NA","Unknown!","Unknown")]
+    lca = ttree.get_lca([futils.to_bytes(m) for m in known],minimum,True,method)
+    return futils.to_str(lca)
 
 
+# Taxonomy strings are shared by many sequences, so
+# only one copy of each is kept in memory
 def _get_taxa(basta):
     taxa = {}
     with open(basta,"r") as f:
@@ -63,34 +84,52 @@ def _get_taxa(basta):
             if line == "\n":
                 continue
             cols = line.split()
-            ass = cols[0].split(".")[0]
-            taxa[ass] = cols[1]
+            taxa[cols[0].split(".")[0]] = intern(cols[1])
     return taxa
 
 
 
-def _get_clusters(uc_file,taxa):
-    clusters = {}
+# Generator returning (centroid, member taxa) of each cluster as
+# soon as it is complete: when its C record is read or, if the file
+# is grouped by cluster number, when the next cluster starts. In a
+# grouped file the records of a cluster can be in any order (e.g.
+# after sort -k2,2n), so C records are not used there. All remaining
+# clusters are returned at the end of the file.
+# usearch and vsearch write all C records at the end of the file and
+# the H records of a cluster can follow its S record anywhere, so
+# without -g all clusters of such a file are held in memory until
+# its end.
+def _cluster_gen(uc_file,taxa,grouped):
+    clusters = OrderedDict()
     with open(uc_file,"r") as f:
         for line in f:
-            cols = line.split()
-            if cols[0] == "S":
-                if cols[8].split(".")[0] in taxa:
-                    clusters[cols[8].split(".")[0]] = [taxa[cols[8].split(".")[0]]]
-                else:
-                    clusters[cols[8].split(".")[0]] = ["NA"]
-            else:
-                if cols[0] == "C":
-                    continue
-                if cols[9].split(".")[0] in taxa:
-                    if cols[8].split(".")[0] in taxa:
-                        clusters[cols[9].split(".")[0]].append(taxa[cols[8].split(".")[0]])
-                    else:
-                        clusters[cols[9].split(".")[0]].append("Unknown!")
+            cols = line.rstrip("\n").split("\t")
+            rec = cols[0]
+            num = cols[1]
+            if grouped and num not in clusters:
+                while clusters:
+                    yield clusters.popitem(last=False)[1]
+            if rec == "C":
+                if num in clusters and not grouped:
+                    yield clusters.pop(num)
+                continue
+
+            query = cols[8].split(".")[0]
+            if rec == "S":
+                # members read before the centroid are kept
+                members = clusters[num][1] if num in clusters else []
+                members.insert(0,taxa.get(query,"NA"))
+                clusters[num] = (query,members)
+            elif rec == "H":
+                target = cols[9].split(".")[0]
+                if num not in clusters:
+                    clusters[num] = (target,[])
+                if target in taxa:
+                    clusters[num][1].append(taxa.get(query,"Unknown!"))
                 else:
-                    clusters[cols[9].split(".")[0]].append("NA")
-                
-    return clusters
+                    clusters[num][1].append("NA")
+    while clusters:
+        yield clusters.popitem(last=False)[1]
 
 
 
@@ -99,10 +138,13 @@ def _get_clusters(uc_file,taxa):
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Print all taxa in uc-clusters.")
+    parser = argparse.ArgumentParser(description="Print all taxa in uc-clusters. usearch and vsearch write the C records of all clusters at the end of a uc file, so all clusters are kept in memory until then unless the file is sorted by cluster number (sort -t$'\\t' -k2,2n) and -g is given.")
     parser.add_argument("uc", help="UC file")
     parser.add_argument("output", help="Output file")
     parser.add_argument("basta", help="BASTA taxonomy file")
+    parser.add_argument("-g","--grouped", help="Cluster file is sorted by cluster number: write each cluster as soon as the next one starts and keep only one cluster in memory", action="store_true")
+    parser.add_argument("-c","--consensus", help="Add consensus taxonomy of each cluster to its header line", choices=['all','majority'], default="")
+    parser.add_argument("-m","--minimum", help="Minimum number of member taxa supporting the consensus (default=1)", type=int, default=1)
 
     args = parser.parse_args()
     main(args)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import gzip
+import json
+import shutil
+import logging
+import tempfile
+import unittest
+
+# Quick'n'Dirty! Change!
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from basta import AssignTaxonomy
+from basta import Checkpoint
+from basta import DBBackends
+
+############
+#
+#   Tests of the checkpoints of 'basta sequence' (-K/--checkpoint
+#   and -R/--resume)
+#
+####
+#   COPYRIGHT DISCLAIMER:
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   Author: BASTA contributors
+#   Date:   October 2026
+#
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmp = tempfile.mkdtemp(prefix="basta_test_")
+        self.blast = os.path.join(self.tmp,"hits.tsv")
+        with open(self.blast,"wb") as f:
+            f.write(b"query1\tsubject1\t99.0\t100\t0\t0\t1\t100\t1\t100\t1e-50\t200\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+        logging.disable(logging.NOTSET)
+
+    def _assigner(self,interval,resume):
+        assigner = AssignTaxonomy.Assigner(1e-5,100,80,0,3,True,"lca",self.tmp,None,os.path.join(self.tmp,"out.txt"))
+        assigner.checkpoint_interval = interval
+        assigner.resume = resume
+        return assigner
+
+    # Checkpoint of a basta sequence run as set up by BastaMain
+    def _checkpoint(self,interval,resume):
+        return self._assigner(interval,resume)._init_checkpoint(self.blast,"prot_mapping.db",0)
+
+    # Checkpoint left by a run killed before writing any output
+    def _interrupted(self,interval):
+        assigner = self._assigner(interval,False)
+        ckpt = assigner._init_checkpoint(self.blast,"prot_mapping.db",0)
+        assigner._write_checkpoint(ckpt,None)
+
+    # Number of checkpoints written while processing the given
+    # number of queries, as in Assigner._assign_sequence
+    def _writes(self,ckpt,queries):
+        writes = 0
+        for i in range(queries):
+            if ckpt.due():
+                ckpt.write({})
+                writes += 1
+        return writes
+
+    def test_no_checkpoints(self):
+        self.assertEqual(self._checkpoint(0,False),None)
+
+    def test_resume_without_checkpoint(self):
+        ckpt = self._checkpoint(0,True)
+        self.assertEqual(ckpt.state,None)
+        self.assertEqual(ckpt.interval,Checkpoint.INTERVAL)
+        self.assertEqual(self._writes(ckpt,10000),0)
+
+    def test_resume_keeps_interval(self):
+        self._interrupted(60)
+        self.assertEqual(self._checkpoint(0,True).interval,60)
+        self.assertEqual(self._checkpoint(30,True).interval,30)
+
+    def test_resume_other_settings(self):
+        self._interrupted(60)
+        with open(self.blast,"ab") as f:
+            f.write(b"query2\tsubject1\t99.0\t100\t0\t0\t1\t100\t1\t100\t1e-50\t200\n")
+        self.assertRaises(SystemExit,self._checkpoint,0,True)
+
+
+
+class Killed(Exception):
+    pass
+
+
+class KilledAssigner(AssignTaxonomy.Assigner):
+    """Assigner that is killed when it is due for checkpoint number
+    'kill', after its output since the last checkpoint was written"""
+
+    kill = 50
+
+    def _write_checkpoint(self,ckpt,out_fh):
+        self.kill -= 1
+        if not self.kill:
+            out_fh.flush()
+            raise Killed()
+        AssignTaxonomy.Assigner._write_checkpoint(self,ckpt,out_fh)
+
+
+class ResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmp = tempfile.mkdtemp(prefix="basta_test_")
+        DBBackends.SQLiteStore.build(os.path.join(self.tmp,"complete_taxa.db"),((b"%d" % (t),b"Bacteria;Phy%d;Cl%d;Or;Fa%d;Ge%d;Sp%d;" % (t % 3,t % 5,t % 7,t,t)) for t in range(40)))
+        DBBackends.SQLiteStore.build(os.path.join(self.tmp,"prot_mapping.db"),((b"ACC%d" % (a),b"%d" % (a % 40)) for a in range(150)))
+        # hits of accessions >= 150 are not in the mapping database
+        self.hits = b"".join(b"query%d\tdb|ACC%d.1|x\t%d.0\t100\t0\t0\t1\t100\t1\t100\t1e-50\t200\n" % (q,(q * 7 + h * 13) % 160,80 + (q + h) % 20) for q in range(400) for h in range(q % 4 + 1))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+        logging.disable(logging.NOTSET)
+
+    def _run(self,cls,blast,name,interval,resume):
+        output = os.path.join(self.tmp,name)
+        assigner = cls(1e-5,100,80,0,1,True,"all",self.tmp,None,output)
+        assigner.abundance_file = output + ".abundance"
+        assigner.checkpoint_interval = interval
+        assigner.resume = resume
+        assigner._assign_sequence(blast,"prot_mapping.db",0)
+        return output
+
+    def _read(self,path):
+        with open(path,"rb") as f:
+            return f.read()
+
+    # Run killed after a checkpoint and resumed gives the same
+    # output and abundance table as a run without interruption
+    def _test_resume(self,blast):
+        expected = self._run(AssignTaxonomy.Assigner,blast,"expected.txt",0,False)
+        self.assertRaises(Killed,self._run,KilledAssigner,blast,"out.txt",1e-9,False)
+        with open(os.path.join(self.tmp,"out.txt" + Checkpoint.SUFFIX),"r") as f:
+            state = json.load(f)
+        self.assertTrue(0 < state['offset'] < len(self.hits))
+        self.assertTrue(state['output_offset'] < os.path.getsize(os.path.join(self.tmp,"out.txt")))
+        output = self._run(AssignTaxonomy.Assigner,blast,"out.txt",0,True)
+        self.assertEqual(self._read(output),self._read(expected))
+        self.assertEqual(self._read(output + ".abundance"),self._read(expected + ".abundance"))
+        self.assertFalse(os.path.exists(output + Checkpoint.SUFFIX))
+
+    def test_resume(self):
+        blast = os.path.join(self.tmp,"hits.tsv")
+        with open(blast,"wb") as f:
+            f.write(self.hits)
+        self._test_resume(blast)
+
+    def test_resume_gzip(self):
+        blast = os.path.join(self.tmp,"hits.tsv.gz")
+        with gzip.open(blast,"wb") as f:
+            f.write(self.hits)
+        self._test_resume(blast)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import gzip
+import shutil
+import tempfile
+import unittest
+
+# Quick'n'Dirty! Change!
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from basta import FileUtils as futils
+
+############
+#
+#   Tests of reading gzip and zstd compressed hit files
+#
+####
+#   COPYRIGHT DISCLAIMER:
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   Author: BASTA contributors
+#   Date:   October 2026
+#
+
+
+LINES = [b"query%d\tsubject%d\t99.0\t100\t0\t0\t1\t100\t1\t100\t1e-50\t200\n" % (i,i % 97) for i in range(20000)]
+
+
+class CompressedInputTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="basta_test_")
+        self.data = b"".join(LINES)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _write(self,name,data):
+        path = os.path.join(self.tmp,name)
+        with open(path,"wb") as f:
+            f.write(data)
+        return path
+
+    def _read(self,path):
+        with futils.open_hit_file(path) as f:
+            return b"".join(f)
+
+    def _gzip(self,data):
+        path = os.path.join(self.tmp,"tmp.gz")
+        with gzip.open(path,"wb") as f:
+            f.write(data)
+        with open(path,"rb") as f:
+            return f.read()
+
+    def test_gzip(self):
+        self.assertEqual(self._read(self._write("hits.gz",self._gzip(self.data))),self.data)
+
+    def test_gzip_members(self):
+        half = len(LINES) // 2
+        data = self._gzip(b"".join(LINES[:half])) + self._gzip(b"".join(LINES[half:]))
+        self.assertEqual(self._read(self._write("hits.gz",data)),self.data)
+
+    def test_truncated_gzip(self):
+        data = self._gzip(self.data)
+        for end in (len(data) // 2,len(data) - 4):
+            path = self._write("hits.gz",data[:end])
+            self.assertRaises(IOError,self._read,path)
+
+    @unittest.skipIf(futils.zstandard is None,"zstandard not installed")
+    def test_zstd(self):
+        data = futils.zstandard.ZstdCompressor().compress(self.data)
+        self.assertEqual(self._read(self._write("hits.zst",data)),self.data)
+
+    @unittest.skipIf(futils.zstandard is None,"zstandard not installed")
+    def test_zstd_frames(self):
+        half = len(LINES) // 2
+        c = futils.zstandard.ZstdCompressor()
+        data = c.compress(b"".join(LINES[:half])) + c.compress(b"".join(LINES[half:]))
+        self.assertEqual(self._read(self._write("hits.zst",data)),self.data)
+
+    @unittest.skipIf(futils.zstandard is None,"zstandard not installed")
+    def test_truncated_zstd(self):
+        data = futils.zstandard.ZstdCompressor().compress(self.data)
+        for end in (len(data) // 2,len(data) - 3):
+            path = self._write("hits.zst",data[:end])
+            self.assertRaises(IOError,self._read,path)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# Quick'n'Dirty! Change!
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from basta import DBBackends
+
+############
+#
+#   Tests of the storage backends of the mapping databases
+#
+####
+#   COPYRIGHT DISCLAIMER:
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+#
+#   Author: BASTA contributors
+#   Date:   October 2026
+#
+
+
+# Unprivileged user for tests that run as root,
+# who could otherwise write to any directory
+NOBODY = 65534
+
+
+class SQLiteStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="basta_test_")
+        self.db = os.path.join(self.tmp,"prot_mapping.db")
+        DBBackends.SQLiteStore.build(self.db,iter([(b"A1.1",b"9606"),(b"B2.1",b"562")]))
+
+    def tearDown(self):
+        os.chmod(self.db,0o755)
+        shutil.rmtree(self.tmp)
+
+    # Exit status of a child process that reads the store
+    # without write permission on its directory
+    def _read_only(self):
+        os.chmod(self.tmp,0o755)
+        os.chmod(self.db,0o555)
+        pid = os.fork()
+        if not pid:
+            status = 1
+            try:
+                if os.geteuid() == 0:
+                    os.setgid(NOBODY)
+                    os.setuid(NOBODY)
+                store = DBBackends.SQLiteStore(self.db)
+                if store.get(b"A1.1") == b"9606" and store.multi_get([b"B2.1",b"C3.1"]) == [b"562",None]:
+                    status = 0
+                store.close()
+            finally:
+                os._exit(status)
+        return os.WEXITSTATUS(os.waitpid(pid,0)[1])
+
+    @unittest.skipUnless(hasattr(os,"fork"),"needs os.fork")
+    def test_read_only_directory(self):
+        self.assertEqual(self._read_only(),0)
+        self.assertEqual(os.listdir(self.db),[DBBackends.SQLiteStore.FILE])
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+
+import argparse
+import gzip
+import os
+import sys
+from array import array
+from multiprocessing import Pool
+
+
+RANKS = ["superkingdom", "phylum", "class", "order", "family", "genus", "species"]
+
+# Kraken style rank codes of centrifuge-kreport matching the BASTA ranks
+KREPORT_RANKS = ["D", "P", "C", "O", "F", "G", "S"]
+
+
+def get_args():
+    '''This function parses and return arguments passed in'''
+    parser = argparse.ArgumentParser(
+        prog='merge-abundance',
+        description="""
+        Merge per sample BASTA outputs (*.basta.out), BASTA abundance tables (basta sequence -A)
+        and Centrifuge kreports into one sparse taxon x sample count matrix.
+        Writes {out}.mtx (Matrix Market coordinate format, one sample after the other),
+        {out}.taxa.tsv (matrix rows) and {out}.samples.tsv (matrix columns)
+        """)
+    parser.add_argument('infiles', nargs='*', help="per sample result files")
+    parser.add_argument(
+        '-list',
+        default=None,
+        help="File with one result file per line")
+    parser.add_argument(
+        '-out',
+        default="abundance",
+        help="Output prefix. Default = abundance")
+    parser.add_argument(
+        '-threads',
+        default=4,
+        type=int,
+        help="Number of files parsed in parallel. Default = 4")
+    parser.add_argument(
+        '-dense',
+        action='store_true',
+        help="Also write the matrix as tab separated table {out}.tsv")
+
+    args = parser.parse_args()
+
+    infiles = list(args.infiles)
+    if args.list:
+        with open(args.list, "r") as f:
+            infiles += [line.strip() for line in f if line.strip()]
+    if not infiles:
+        parser.error("no input files given")
+
+    return(infiles, args.out, args.threads, args.dense)
+
+
+def get_basename(file_name):
+    if ("/") in file_name:
+        basename = file_name.split("/")[-1].split(".")[0]
+    else:
+        basename = file_name.split(".")[0]
+    return(basename)
+
+
+def open_file(file_name):
+    if file_name.endswith(".gz"):
+        return gzip.open(file_name, "rt" if sys.version_info[0] > 2 else "r")
+    return open(file_name, "r")
+
+
+def get_format(file_name):
+    '''Guess the format of a result file from its first line'''
+    with open_file(file_name) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            if line.startswith("#rank"):
+                return("abundance")
+            ls = line.rstrip("\n").split("\t")
+            if len(ls) >= 6 and ls[0].strip().replace(".", "", 1).isdigit():
+                return("kreport")
+            return("basta")
+    return("basta")
+
+
+def parse_sample(file_name):
+    '''Counts of one sample as {lineage: number of reads}. Lineages are
+    BASTA style taxon strings, e.g. Bacteria;Firmicutes; or Unknown'''
+    fmt = get_format(file_name)
+    counts = {}
+    with open_file(file_name) as f:
+        if fmt == "abundance":
+            parse_abundance(f, counts)
+        elif fmt == "kreport":
+            parse_kreport(f, counts)
+        else:
+            parse_basta(f, counts)
+    return(get_basename(file_name), fmt, file_name, counts)
+
+
+def parse_basta(f, counts):
+    '''One LCA per read in column 2'''
+    for line in f:
+        if line.startswith("#"):
+            continue
+        ls = line.rstrip("\n").split("\t")
+        if len(ls) < 2:
+            continue
+        counts[ls[1]] = counts.get(ls[1], 0) + 1
+
+
+def parse_abundance(f, counts):
+    '''Reads assigned to each taxon in column lca_queries'''
+    for line in f:
+        if line.startswith("#"):
+            continue
+        ls = line.rstrip("\n").split("\t")
+        if int(ls[3]):
+            counts[ls[1]] = counts.get(ls[1], 0) + int(ls[3])
+
+
+def parse_kreport(f, counts):
+    '''Reads assigned directly to a taxon (column 3) are counted for the
+    lineage of its closest ancestor at one of the BASTA ranks. The
+    hierarchy is given by the indentation of the names (column 6).'''
+    stack = []
+    for line in f:
+        ls = line.rstrip("\n").split("\t")
+        if len(ls) < 6:
+            continue
+        name = ls[5]
+        depth = len(name) - len(name.lstrip(" "))
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        # Same name cleanup as the BASTA taxonomy creator
+        stack.append((depth, ls[3].strip(), name.strip().replace(";", "_").replace(" ", "_")))
+        reads = int(ls[2])
+        if not reads:
+            continue
+        lineage = kreport_lineage(stack)
+        counts[lineage] = counts.get(lineage, 0) + reads
+
+
+def kreport_lineage(stack):
+    names = {}
+    for (depth, rank, name) in stack:
+        if rank in KREPORT_RANKS:
+            names[KREPORT_RANKS.index(rank)] = name
+    if not names:
+        return("Unknown")
+    return("".join(names.get(i, "unknown") + ";" for i in range(max(names) + 1)))
+
+
+def get_rank(lineage):
+    depth = len([x for x in lineage.split(";") if x])
+    if not depth or lineage == "Unknown":
+        return("unassigned")
+    return(RANKS[depth - 1] if depth <= len(RANKS) else "rank_%d" % (depth))
+
+
+def merge(infiles, threads):
+    '''Parse samples in parallel and collect the non-zero counts as
+    (taxon, sample, count) triplets in arrays. Only the counts of the
+    samples currently parsed are held as dicts.'''
+    taxa = {}
+    samples = []
+    rows = array("L")
+    cols = array("L")
+    values = array("L")
+    pool = Pool(max(1, threads))
+    for (sample, fmt, file_name, counts) in pool.imap(parse_sample, infiles):
+        col = len(samples)
+        samples.append((sample, fmt, file_name))
+        for lineage in sorted(counts):
+            if lineage not in taxa:
+                taxa[lineage] = len(taxa)
+            rows.append(taxa[lineage])
+            cols.append(col)
+            values.append(counts[lineage])
+        print("Parsed %s (%s): %d taxa" % (file_name, fmt, len(counts)))
+    pool.close()
+    pool.join()
+    return(taxa, samples, rows, cols, values)
+
+
+def write_matrix(out, taxa, samples, rows, cols, values, dense):
+    with open(out + ".mtx", "w") as f:
+        f.write("%%MatrixMarket matrix coordinate integer general\n")
+        f.write("%% rows: %s.taxa.tsv, columns: %s.samples.tsv\n" % (out, out))
+        f.write("%d %d %d\n" % (len(taxa), len(samples), len(values)))
+        for i in range(len(values)):
+            f.write("%d %d %d\n" % (rows[i] + 1, cols[i] + 1, values[i]))
+
+    names = sorted(taxa, key=taxa.get)
+    with open(out + ".taxa.tsv", "w") as f:
+        for lineage in names:
+            f.write("%s\t%s\n" % (lineage, get_rank(lineage)))
+    with open(out + ".samples.tsv", "w") as f:
+        for (sample, fmt, file_name) in samples:
+            f.write("%s\t%s\t%s\n" % (sample, fmt, os.path.abspath(file_name)))
+
+    if dense:
+        table = [[0] * len(samples) for t in names]
+        for i in range(len(values)):
+            table[rows[i]][cols[i]] = values[i]
+        with open(out + ".tsv", "w") as f:
+            f.write("taxon\trank\t" + "\t".join(s[0] for s in samples) + "\n")
+            for (lineage, counts) in zip(names, table):
+                f.write("%s\t%s\t%s\n" % (lineage, get_rank(lineage), "\t".join(str(c) for c in counts)))
+
+
+if __name__ == "__main__":
+    infiles, out, threads, dense = get_args()
+
+    taxa, samples, rows, cols, values = merge(infiles, threads)
+    write_matrix(out, taxa, samples, rows, cols, values, dense)
+    print("Wrote %d taxa x %d samples (%d non-zero counts) to %s.mtx" % (len(taxa), len(samples), len(values), out))